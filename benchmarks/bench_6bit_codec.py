@@ -0,0 +1,64 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compare the bit by bit 6bit filename codec against the table driven one
+
+    python3 benchmarks/bench_6bit_codec.py [NAMES]
+"""
+
+
+from typing import Any, Callable
+
+import random
+import sys
+import time
+
+from pecryptfs.filename import (convert_6bit_to_8bit, convert_8bit_to_6bit,
+                                convert_6bit_to_8bit_reference, convert_8bit_to_6bit_reference)
+
+
+def measure(func: Callable[[Any], Any], corpus: list[Any]) -> float:
+    start = time.perf_counter()
+    for item in corpus:
+        func(item)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    # encrypted filenames carry 42 to 170 bytes of payload
+    rng = random.Random(0)
+    corpus_8bit = [rng.randbytes(rng.randrange(42, 171)) for _ in range(count)]
+    corpus_6bit = [convert_8bit_to_6bit(data) for data in corpus_8bit]
+
+    tasks: list[tuple[str, Callable[[Any], Any], Callable[[Any], Any], list[Any]]] = [
+        ("8bit->6bit", convert_8bit_to_6bit_reference, convert_8bit_to_6bit, corpus_8bit),
+        ("6bit->8bit", convert_6bit_to_8bit_reference, convert_6bit_to_8bit, corpus_6bit)]
+
+    for name, reference, fast, corpus in tasks:
+        before = measure(reference, corpus)
+        after = measure(fast, corpus)
+        print("{}  {} names  before {:7.2f} s  after {:7.2f} s  speedup {:5.1f}x".format(
+            name, count, before, after, before / after))
+
+
+if __name__ == "__main__":
+    main()
+
+
+# EOF #
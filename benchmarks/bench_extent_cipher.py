@@ -0,0 +1,89 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compare per extent cipher setup against the cached ExtentCipher
+
+    python3 benchmarks/bench_extent_cipher.py [EXTENTS]
+"""
+
+
+from typing import Any
+
+import hashlib
+import os
+import struct
+import sys
+import time
+
+from Crypto.Cipher import AES, Blowfish
+
+from pecryptfs.file import ExtentCipher
+
+
+def decrypt_before(key: bytes, cipher: str, root_iv: bytes, extents: list[bytes]) -> None:
+    """The per extent setup File.read() used to do"""
+    for page, data in enumerate(extents):
+        derived_iv = hashlib.md5(root_iv + struct.pack("<Q", 0x30 + page) + b"\x00" * 8).digest()
+        decryptor: Any
+        if cipher == "aes":
+            decryptor = AES.new(key, AES.MODE_CBC, derived_iv)
+        else:
+            decryptor = Blowfish.new(key, Blowfish.MODE_CBC, derived_iv[:8])
+        decryptor.decrypt(data)
+
+
+def decrypt_after(key: bytes, cipher: str, root_iv: bytes, extents: list[bytes]) -> None:
+    extent_cipher = ExtentCipher(key, cipher, len(key), root_iv)
+    for extent, data in enumerate(extents):
+        extent_cipher.decrypt(extent, data)
+
+
+def decrypt_after_into(key: bytes, cipher: str, root_iv: bytes, extents: list[bytes]) -> None:
+    extent_cipher = ExtentCipher(key, cipher, len(key), root_iv)
+    output = bytearray(4096)
+    for extent, data in enumerate(extents):
+        extent_cipher.decrypt_into(extent, data, output)
+
+
+def decrypt_run(key: bytes, cipher: str, root_iv: bytes, extents: list[bytes]) -> None:
+    """Runs of 64 extents with one cipher call each, as File does"""
+    extent_cipher = ExtentCipher(key, cipher, len(key), root_iv)
+    for extent in range(0, len(extents), 64):
+        extent_cipher.decrypt_run(extent, b"".join(extents[extent:extent + 64]))
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    extents = [os.urandom(4096) for _ in range(count)]
+    root_iv = os.urandom(16)
+
+    for cipher, key_bytes in [("aes", 16), ("aes", 32), ("blowfish", 16)]:
+        key = os.urandom(key_bytes)
+        for name, func in [("before", decrypt_before), ("after", decrypt_after), ("into", decrypt_after_into),
+                           ("run", decrypt_run)]:
+            start = time.perf_counter()
+            func(key, cipher, root_iv, extents)
+            elapsed = time.perf_counter() - start
+            print("{:8} {:2} {:6}  {:8.2f} us/extent  {:8.1f} MiB/s".format(
+                cipher, key_bytes, name, elapsed / count * 1e6, count * 4096 / elapsed / 2**20))
+
+
+if __name__ == "__main__":
+    main()
+
+
+# EOF #
@@ -0,0 +1,49 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compare the reference session key derivation against the fast one
+
+    python3 benchmarks/bench_kdf.py [ROUNDS]
+"""
+
+
+import sys
+import time
+
+from pecryptfs.auth_token import derive_session_key, derive_session_key_reference, find_builtin_sha512
+
+
+def main() -> None:
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    salt = bytes.fromhex("0011223344556677")
+
+    print("builtin sha512:", find_builtin_sha512())
+    for name, func in [("reference", derive_session_key_reference), ("fast", derive_session_key)]:
+        timings = []
+        for i in range(rounds):
+            start = time.perf_counter()
+            func(salt, b"Password%d" % i)
+            timings.append(time.perf_counter() - start)
+        print("{:10}  best {:7.2f} ms  mean {:7.2f} ms".format(
+            name, min(timings) * 1000, sum(timings) / len(timings) * 1000))
+
+
+if __name__ == "__main__":
+    main()
+
+
+# EOF #
@@ -0,0 +1,75 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compare buffered reads against the mmap path of File
+
+    python3 benchmarks/bench_mmap.py [SIZE_MIB]
+"""
+
+
+from typing import Callable
+
+import os
+import sys
+import tempfile
+import time
+
+from pecryptfs.auth_token import AuthToken
+from pecryptfs.file import File, FileWriter
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def read_into(fin: File) -> None:
+    buf = bytearray(CHUNK_SIZE)
+    while fin.readinto(buf):
+        pass
+
+
+def read_extents(fin: File) -> None:
+    for _ in fin.iter_extents():
+        pass
+
+
+def main() -> None:
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 256) * 2**20
+    auth_token = AuthToken("Test")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "bench.raw")
+        with FileWriter.from_file(filename, auth_token, "aes", 16) as fout:
+            chunk = os.urandom(CHUNK_SIZE)
+            for _ in range(size // CHUNK_SIZE):
+                fout.write(chunk)
+
+        funcs: list[tuple[str, Callable[[File], None]]] = [("readinto", read_into), ("iter_extents", read_extents)]
+        for name, func in funcs:
+            for use_mmap in [False, True]:
+                with File.from_file(filename, auth_token, "aes", 16, use_mmap=use_mmap) as fin:
+                    start = time.perf_counter()
+                    func(fin)
+                    elapsed = time.perf_counter() - start
+                print("{:12} {:8}  {:8.1f} MiB/s".format(
+                    name, "mmap" if use_mmap else "buffered", size / elapsed / 2**20))
+
+
+if __name__ == "__main__":
+    main()
+
+
+# EOF #
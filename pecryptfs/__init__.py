@@ -15,14 +15,46 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from typing import Any, TYPE_CHECKING
+
+import importlib
+
 from .util import h2b, b2h
-from .auth_token import AuthToken
-from .filename import encrypt_filename, decrypt_filename
-from .file import File
+
+if TYPE_CHECKING:
+    from .auth_token import AuthToken
+    from .filename import FilenameCodec, encrypt_filename, decrypt_filename
+    from .file import File
+
+
+# name -> submodule, imported on first access so that commands which
+# don't need the ciphers don't pay for loading them
+_LAZY_EXPORTS = {
+    "AuthToken": ".auth_token",
+    "FilenameCodec": ".filename",
+    "encrypt_filename": ".filename",
+    "decrypt_filename": ".filename",
+    "File": ".file",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
 
 
 __all__ = ["h2b", "b2h",
            "AuthToken", "File",
+           "FilenameCodec",
            "encrypt_filename",
            "decrypt_filename"]
 
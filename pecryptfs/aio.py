@@ -0,0 +1,147 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, Type, TypeVar
+from types import TracebackType
+
+import asyncio
+import functools
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pecryptfs.auth_token import AuthToken
+from pecryptfs.file import EXTENT_BATCH_SIZE, File
+from pecryptfs.define import ECRYPTFS_DEFAULT_EXTENT_SIZE
+from pecryptfs.filename import FilenameCodec
+
+
+T = TypeVar("T")
+
+# a whole batch of extents, so that each chunk is a single cipher call
+DEFAULT_CHUNK_SIZE = EXTENT_BATCH_SIZE * ECRYPTFS_DEFAULT_EXTENT_SIZE
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """The bounded thread pool shared by all pecryptfs.aio calls, file
+    I/O, cipher work and the key derivation run there so that they never
+    block the event loop"""
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4),
+                                           thread_name_prefix="pecryptfs-aio")
+        return _executor
+
+
+def set_executor(executor: ThreadPoolExecutor) -> None:
+    """Replace the shared thread pool, e.g. to change its size"""
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        _executor = executor
+
+
+async def run_in_executor(func: Callable[..., T], *args: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args))
+
+
+async def derive_key(auth_token: AuthToken) -> bytes:
+    """Derive the session key off the loop, concurrent callers share a
+    single derivation per AuthToken"""
+    return await run_in_executor(lambda: auth_token.session_key)
+
+
+class AsyncFile:
+    """asyncio counterpart of File, operations on one AsyncFile must not
+    overlap, separate AsyncFiles can be used concurrently"""
+
+    @staticmethod
+    async def open(filename: str, auth_token: AuthToken, cipher: Optional[str] = None,
+                   key_bytes: Optional[int] = None, use_mmap: bool = False) -> 'AsyncFile':
+        await derive_key(auth_token)
+        efs = await run_in_executor(functools.partial(File.from_file, filename, auth_token, cipher, key_bytes,
+                                                      use_mmap=use_mmap))
+        return AsyncFile(efs)
+
+    def __init__(self, efs: File) -> None:
+        self.file = efs
+
+    @property
+    def file_size(self) -> int:
+        return self.file.file_size
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    async def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.file.seek(offset, whence)
+
+    async def read(self, size: int = -1) -> bytes:
+        result: bytes = await run_in_executor(self.file.read, size)
+        return result
+
+    async def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Decrypt the file from the current position to the end, one
+        chunk per executor call"""
+        while True:
+            data = await self.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+    async def close(self) -> None:
+        await run_in_executor(self.file.close)
+
+    async def __aenter__(self) -> 'AsyncFile':
+        return self
+
+    async def __aexit__(self,
+                        exc_type: Optional[Type[BaseException]],
+                        exc_value: Optional[BaseException],
+                        traceback: Optional[TracebackType]) -> None:
+        await self.close()
+
+
+async def encrypt_filenames(filenames: Iterable[str], auth_token: AuthToken,
+                            cipher: str = "aes", key_bytes: int = 24) -> list[str]:
+    await derive_key(auth_token)
+    codec = FilenameCodec(auth_token, cipher, key_bytes)
+    return await run_in_executor(lambda: list(codec.encrypt_many(filenames)))
+
+
+async def decrypt_filenames(enc_filenames: Iterable[str], auth_token: AuthToken,
+                            cipher: str = "aes", key_bytes: int = 24) -> list[str]:
+    await derive_key(auth_token)
+    codec = FilenameCodec(auth_token, cipher, key_bytes)
+    return await run_in_executor(lambda: list(codec.decrypt_many(enc_filenames)))
+
+
+async def encrypt_filename(filename: str, auth_token: AuthToken, cipher: str = "aes", key_bytes: int = 24) -> str:
+    return (await encrypt_filenames([filename], auth_token, cipher, key_bytes))[0]
+
+
+async def decrypt_filename(enc_filename: str, auth_token: AuthToken,
+                           cipher: str = "aes", key_bytes: int = 24) -> str:
+    return (await decrypt_filenames([enc_filename], auth_token, cipher, key_bytes))[0]
+
+
+# EOF #
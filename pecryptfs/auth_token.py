@@ -15,35 +15,101 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from typing import Optional
+from typing import Any, Callable, Iterable, Optional, Tuple, TYPE_CHECKING
 
+import functools
 import hashlib
+import importlib
 import os
+import threading
+
+if TYPE_CHECKING:
+    from pecryptfs.key_cache import KeyCache
+
+
+HASH_ITERATIONS = 65536
+
+
+def derive_session_key_reference(salt: bytes, password: bytes, iterations: int = HASH_ITERATIONS) -> bytes:
+    """Iterated SHA-512 over salt and password, as done by
+    ecryptfs-utils generate_passphrase_sig()"""
+    tmp_key: bytes = salt + password
+    for _ in range(iterations):
+        tmp_key = hashlib.sha512(tmp_key).digest()
+    return tmp_key
+
+
+def find_builtin_sha512() -> Optional[Callable[[bytes], Any]]:
+    """Return CPython's builtin SHA-512 constructor. For 64 byte
+    inputs it is considerably faster than hashlib's OpenSSL based one, as
+    it doesn't have to set up an EVP context for every call."""
+    # the module got renamed from _sha512 to _sha2 in Python 3.12
+    for module_name in ["_sha2", "_sha512"]:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+
+        sha512: Callable[[bytes], Any] = module.sha512
+        return sha512
+
+    return None
+
+
+_builtin_sha512 = find_builtin_sha512()
+
+
+def derive_session_key(salt: bytes, password: bytes, iterations: int = HASH_ITERATIONS) -> bytes:
+    """Same as derive_session_key_reference(), but using the fastest
+    available SHA-512 implementation"""
+    sha512 = _builtin_sha512
+    if sha512 is None:
+        return derive_session_key_reference(salt, password, iterations)
+
+    tmp_key: bytes = salt + password
+    for _ in range(iterations):
+        tmp_key = sha512(tmp_key).digest()
+    return tmp_key
+
+
+def _check_password(salt: str, signature: str, password: str) -> Tuple[str, bool]:
+    return password, AuthToken(password, salt).signature_text == signature
 
 
 class AuthToken:
 
-    def __init__(self, password: str, salt: str = "0011223344556677") -> None:
+    def __init__(self, password: str, salt: str = "0011223344556677",
+                 key_cache: Optional['KeyCache'] = None) -> None:
         self.password_text: str = password
         self.password_bin: bytes = os.fsencode(password)
 
         self.salt_text: str = salt
         self.salt_bin: bytes = bytes.fromhex(salt)
 
+        self.key_cache = key_cache
+
         self._session_key: Optional[bytes] = None
         self._signature: Optional[str] = None
 
+        # threads asking for the key at the same time share one derivation
+        self._lock = threading.Lock()
+
     @property
     def session_key(self) -> bytes:
-        if self._session_key is None:
-            hash_iterations = 65536
+        if self._session_key is not None:
+            return self._session_key
+
+        with self._lock:
+            if self._session_key is None and self.key_cache is not None:
+                self._session_key = self.key_cache.get(self.salt_bin, self.password_bin)
 
-            tmp_key: bytes = self.salt_bin + self.password_bin
-            for _ in range(hash_iterations):
-                tmp_key = hashlib.sha512(tmp_key).digest()
-            self._session_key = tmp_key
+            if self._session_key is None:
+                self._session_key = derive_session_key(self.salt_bin, self.password_bin)
 
-        return self._session_key
+                if self.key_cache is not None:
+                    self.key_cache.put(self.salt_bin, self.password_bin, self._session_key)
+
+            return self._session_key
 
     @property
     def signature_text(self) -> str:
@@ -51,5 +117,34 @@ class AuthToken:
             self._signature = hashlib.sha512(self.session_key).digest()[0:8].hex()
         return self._signature
 
+    @staticmethod
+    def find_password(candidates: Iterable[str], signature: str, salt: str = "0011223344556677",
+                      workers: Optional[int] = None) -> Tuple[Optional[str], int]:
+        """Search candidates for the password that produces signature,
+        the key derivation is spread over a pool of worker processes,
+        defaulting to one per core. Returns the password, or None, and
+        the number of candidates that were tried."""
+        check = functools.partial(_check_password, salt, signature.lower())
+        tried = 0
+
+        if workers == 1:
+            for password, match in map(check, candidates):
+                tried += 1
+                if match:
+                    return password, tried
+            return None, tried
+
+        # only needed here, and slow to import
+        import multiprocessing  # pylint: disable=import-outside-toplevel
+
+        with multiprocessing.Pool(workers) as pool:
+            for password, match in pool.imap_unordered(check, candidates, chunksize=16):
+                tried += 1
+                if match:
+                    # leaving the with block terminates the remaining work
+                    return password, tried
+
+        return None, tried
+
 
 # EOF #
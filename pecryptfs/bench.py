@@ -0,0 +1,203 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import fnmatch
+import itertools
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+
+from pecryptfs.auth_token import AuthToken
+from pecryptfs.file import File, FileWriter
+from pecryptfs.filename import FilenameCodec, convert_6bit_to_8bit, convert_8bit_to_6bit
+
+
+# (cipher, key_bytes) combinations understood by File and FilenameCodec
+CIPHERS = [("aes", 16), ("aes", 24), ("aes", 32),
+           ("blowfish", 16), ("blowfish", 32), ("blowfish", 56),
+           ("cast5", 16), ("des3", 24)]
+
+# relative slowdown of ops_per_s that counts as regression
+DEFAULT_TOLERANCE = 0.2
+
+# arguments of run() that change the numbers, reports are only
+# comparable when they match
+RUN_PARAMETERS = ("file_size", "repeat", "names")
+
+Result = Dict[str, Any]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func: Callable[[], Any], repeat: int, bytes_per_call: int = 0) -> Result:
+    """Call func repeat times and summarize the latencies, peak memory
+    is taken from one extra traced call, as tracing slows down the
+    timed ones"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    total = sum(timings)
+    timings.sort()
+    result: Result = {
+        "calls": repeat,
+        "total_s": total,
+        "ops_per_s": repeat / total if total else float("inf"),
+        "p50_us": percentile(timings, 0.50) * 1e6,
+        "p90_us": percentile(timings, 0.90) * 1e6,
+        "p99_us": percentile(timings, 0.99) * 1e6,
+        "max_us": timings[-1] * 1e6,
+        "peak_memory_bytes": peak,
+    }
+    if bytes_per_call:
+        result["mib_per_s"] = bytes_per_call * repeat / total / 2**20 if total else float("inf")
+    return result
+
+
+def each_call(items: list[Any], func: Callable[[Any], Any]) -> Callable[[], Any]:
+    """A callable that works through items one per call, round robin"""
+    it = itertools.cycle(items)
+    return lambda: func(next(it))
+
+
+def iter_benchmarks(tmpdir: str, file_size: int, repeat: int, names: int) -> Iterator[Tuple[str, Callable[[], Result]]]:
+    """Yields (name, run) pairs, run() does the setup and the measurement"""
+    auth_token = AuthToken("Benchmark")
+    rng = random.Random(0)
+
+    def kdf() -> Result:
+        passwords = ["Password{}".format(i) for i in range(repeat + 1)]
+        return measure(each_call(passwords, lambda password: AuthToken(password).session_key), repeat)
+
+    yield "kdf", kdf
+
+    corpus_8bit = [rng.randbytes(rng.randrange(42, 171)) for _ in range(names)]
+    corpus_6bit = [convert_8bit_to_6bit(data) for data in corpus_8bit]
+    yield "codec_8bit_to_6bit", lambda: measure(each_call(corpus_8bit, convert_8bit_to_6bit), names)
+    yield "codec_6bit_to_8bit", lambda: measure(each_call(corpus_6bit, convert_6bit_to_8bit), names)
+
+    plain_names = ["file-{:06d}-{}.txt".format(i, "x" * rng.randrange(0, 100)) for i in range(names)]
+    for cipher, key_bytes in CIPHERS:
+        codec = FilenameCodec(auth_token, cipher, key_bytes)
+
+        def encrypt(codec: FilenameCodec = codec) -> Result:
+            # the first call pays for the key derivation
+            codec.encrypt(plain_names[0])
+            return measure(each_call(plain_names, codec.encrypt), names)
+
+        def decrypt(codec: FilenameCodec = codec) -> Result:
+            enc_names = list(codec.encrypt_many(plain_names))
+            return measure(each_call(enc_names, codec.decrypt), names)
+
+        yield "filename_encrypt_{}_{}".format(cipher, key_bytes), encrypt
+        yield "filename_decrypt_{}_{}".format(cipher, key_bytes), decrypt
+
+    for cipher, key_bytes in CIPHERS:
+        def read(cipher: str = cipher, key_bytes: int = key_bytes) -> Result:
+            path = os.path.join(tmpdir, "{}-{}.raw".format(cipher, key_bytes))
+            with FileWriter.from_file(path, auth_token, cipher, key_bytes) as fout:
+                chunk = rng.randbytes(min(file_size, 2**20))
+                for offset in range(0, file_size, len(chunk)):
+                    fout.write(chunk[:file_size - offset])
+
+            def read_file() -> bytes:
+                with File.from_file(path, auth_token, cipher, key_bytes) as fin:
+                    return fin.read()
+
+            try:
+                return measure(read_file, repeat, bytes_per_call=file_size)
+            finally:
+                os.unlink(path)
+
+        yield "file_read_{}_{}".format(cipher, key_bytes), read
+
+
+def run(file_size: int = 16 * 2**20, repeat: int = 5, names: int = 2000, only: Optional[str] = None,
+        progress: Optional[Callable[[str], None]] = None) -> Result:
+    """Run all benchmarks whose name matches the glob only, a failing
+    benchmark is reported with an "error" entry instead of numbers"""
+    results: Dict[str, Result] = {}
+    with tempfile.TemporaryDirectory(prefix="pecryptfs-bench") as tmpdir:
+        for name, bench in iter_benchmarks(tmpdir, file_size, repeat, names):
+            if only is not None and not fnmatch.fnmatch(name, only):
+                continue
+            if progress is not None:
+                progress(name)
+            try:
+                results[name] = bench()
+            except Exception as err:  # pylint: disable=broad-except
+                results[name] = {"error": "{}: {}".format(type(err).__name__, err)}
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "file_size": file_size,
+        "repeat": repeat,
+        "names": names,
+        "results": results,
+    }
+
+
+def parameter_mismatches(parameters: Result, baseline: Result) -> list[str]:
+    """Returns a description of every run parameter that differs from
+    the one baseline was run with"""
+    return ["{0}={1}, baseline {0}={2}".format(key, parameters.get(key), baseline[key])
+            for key in RUN_PARAMETERS
+            if key in baseline and parameters.get(key) != baseline[key]]
+
+
+def compare(report: Result, baseline: Result, tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """Returns a description of every benchmark that got slower than
+    baseline by more than tolerance, or started failing. Raises
+    ValueError when the two were run with different parameters."""
+    mismatches = parameter_mismatches(report, baseline)
+    if mismatches:
+        raise ValueError("baseline was run with other parameters: {}".format(", ".join(mismatches)))
+
+    regressions = []
+    for name, old in baseline.get("results", {}).items():
+        new = report["results"].get(name)
+        if new is None or "ops_per_s" not in old:
+            continue
+
+        if "error" in new:
+            regressions.append("{}: now fails with {}".format(name, new["error"]))
+        elif new["ops_per_s"] < old["ops_per_s"] * (1 - tolerance):
+            regressions.append("{}: {:.1f} ops/s, baseline {:.1f} ops/s ({:+.0%})".format(
+                name, new["ops_per_s"], old["ops_per_s"], new["ops_per_s"] / old["ops_per_s"] - 1))
+    return regressions
+
+
+# EOF #
@@ -0,0 +1,402 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Any, Dict, Optional, Tuple, Union
+
+import abc
+import importlib
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+
+from pecryptfs.define import (
+    RFC2440_CIPHER_AES_128,
+    RFC2440_CIPHER_AES_192,
+    RFC2440_CIPHER_AES_256,
+    RFC2440_CIPHER_BLOWFISH,
+    RFC2440_CIPHER_CAST_5,
+    RFC2440_CIPHER_CAST_6,
+    RFC2440_CIPHER_DES3_EDE,
+    RFC2440_CIPHER_TWOFISH)
+
+
+# an object with encrypt(data), decrypt(data, output=None) and block_size,
+# the interface of the PyCryptodome cipher objects
+Cipher = Any
+
+# kernel cipher names that differ from the ones used here
+CIPHER_ALIASES = {
+    "des3_ede": "des3",
+}
+
+# (cipher, key bytes) -> RFC2440 tag, None matches any key size
+CIPHER_TAGS: Dict[Tuple[str, Optional[int]], int] = {
+    ("des3", None): RFC2440_CIPHER_DES3_EDE,
+    ("cast5", None): RFC2440_CIPHER_CAST_5,
+    ("blowfish", None): RFC2440_CIPHER_BLOWFISH,
+    ("aes", 16): RFC2440_CIPHER_AES_128,
+    ("aes", 24): RFC2440_CIPHER_AES_192,
+    ("aes", 32): RFC2440_CIPHER_AES_256,
+    ("twofish", None): RFC2440_CIPHER_TWOFISH,
+    ("cast6", None): RFC2440_CIPHER_CAST_6,
+}
+
+# environment variable to force a backend, e.g. "cryptography"
+BACKEND_ENV = "PECRYPTFS_CIPHER_BACKEND"
+
+# bytes en/decrypted per call when timing the backends, "bulk" is what
+# File decrypts at once, "small" is the size of a filename
+CALIBRATION_SIZES = {True: 64 * 1024, False: 64}
+CALIBRATION_CALLS = {True: 2, False: 200}
+
+
+def canonical_name(cipher: str) -> str:
+    return CIPHER_ALIASES.get(cipher, cipher)
+
+
+def get_cipher_tag(cipher: str, key_bytes: int) -> int:
+    cipher = canonical_name(cipher)
+    tag = CIPHER_TAGS.get((cipher, key_bytes), CIPHER_TAGS.get((cipher, None)))
+    if tag is None:
+        raise ValueError("unknown cipher '{}:{}'".format(cipher, key_bytes))
+    return tag
+
+
+def cipher_from_tag(tag: int, key_bytes: int) -> Tuple[str, int]:
+    """Returns the cipher name and key size for an RFC2440 tag, the AES
+    tags determine the key size, for all others key_bytes is used"""
+    for (cipher, tag_key_bytes), candidate in CIPHER_TAGS.items():
+        if candidate == tag:
+            return cipher, tag_key_bytes or key_bytes
+    raise ValueError("unknown cipher tag: {}".format(tag))
+
+
+def key_size(cipher: str, key_bytes: int) -> int:
+    """Number of key bytes actually used for cipher"""
+    cipher = canonical_name(cipher)
+    if cipher == "aes" and key_bytes not in (16, 24, 32):
+        raise ValueError("unknown cipher: {}:{}".format(cipher, key_bytes))
+    if cipher == "des3":
+        return 24
+    return key_bytes
+
+
+class Backend(abc.ABC):
+    """A library providing some of the ciphers, the library is only
+    imported when the backend is first asked for a cipher"""
+
+    name = ""
+
+    # top-level package of the library
+    package = ""
+
+    def fingerprint(self) -> Optional[str]:
+        """Location and mtime of the library, changes whenever it is
+        installed or upgraded, without importing it"""
+        try:
+            spec = importlib.util.find_spec(self.package)
+        except (ImportError, ValueError):
+            return None
+        if spec is None or spec.origin is None:
+            return None
+        try:
+            return "{}:{}".format(spec.origin, os.stat(spec.origin).st_mtime_ns)
+        except OSError:
+            return None
+
+    @abc.abstractmethod
+    def supports(self, cipher: str, key_bytes: int) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def new(self, cipher: str, key: bytes, iv: Optional[bytes] = None) -> Cipher:
+        """Create an ECB cipher, or a CBC one when iv is given"""
+
+
+class PyCryptodomeBackend(Backend):
+
+    name = "pycryptodome"
+    package = "Crypto"
+
+    MODULES = {
+        "aes": "Crypto.Cipher.AES",
+        "blowfish": "Crypto.Cipher.Blowfish",
+        "cast5": "Crypto.Cipher.CAST",
+        "des3": "Crypto.Cipher.DES3",
+    }
+
+    def __init__(self) -> None:
+        self._modules: Dict[str, Any] = {}
+
+    def _module(self, cipher: str) -> Any:
+        module = self._modules.get(cipher)
+        if module is None:
+            module = importlib.import_module(self.MODULES[cipher])
+            self._modules[cipher] = module
+        return module
+
+    def supports(self, cipher: str, key_bytes: int) -> bool:
+        if cipher not in self.MODULES:
+            return False
+        try:
+            return key_bytes in self._module(cipher).key_size
+        except ImportError:
+            return False
+
+    def new(self, cipher: str, key: bytes, iv: Optional[bytes] = None) -> Cipher:
+        module = self._module(cipher)
+        if iv is None:
+            return module.new(key, module.MODE_ECB)
+        else:
+            return module.new(key, module.MODE_CBC, iv=iv)
+
+
+class CryptographyCipher:
+    """PyCryptodome style wrapper around a cipher of the cryptography
+    package. Its contexts are stateful and not safe to share, so every
+    thread gets its own pair. decrypt(output=) copies the result into
+    output, update_into() would need a block of slack behind it."""
+
+    def __init__(self, cipher: Any, block_size: int) -> None:
+        self.block_size = block_size
+        self._cipher = cipher
+        self._local = threading.local()
+
+    def _check_aligned(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        # the contexts would keep a partial block around and prepend it
+        # to the next call, PyCryptodome rejects such data
+        if len(data) % self.block_size:
+            raise ValueError("Data must be aligned to block boundary")
+
+    def encrypt(self, data: Union[bytes, bytearray, memoryview]) -> bytes:
+        self._check_aligned(data)
+        encryptor = getattr(self._local, "encryptor", None)
+        if encryptor is None:
+            encryptor = self._local.encryptor = self._cipher.encryptor()
+        result: bytes = encryptor.update(data)
+        return result
+
+    def decrypt(self, data: Union[bytes, bytearray, memoryview],
+                output: Union[bytearray, memoryview, None] = None) -> Optional[bytes]:
+        self._check_aligned(data)
+        decryptor = getattr(self._local, "decryptor", None)
+        if decryptor is None:
+            decryptor = self._local.decryptor = self._cipher.decryptor()
+        result: bytes = decryptor.update(data)
+        if output is None:
+            return result
+        output[0:len(result)] = result
+        return None
+
+
+class CryptographyBackend(Backend):
+    """OpenSSL through the cryptography package"""
+
+    name = "cryptography"
+    package = "cryptography"
+
+    ALGORITHMS = {
+        "aes": "AES",
+        "blowfish": "Blowfish",
+        "cast5": "CAST5",
+        "des3": "TripleDES",
+    }
+
+    def _algorithm(self, cipher: str) -> Any:
+        # the old ciphers moved to the decrepit module in cryptography 43
+        name = self.ALGORITHMS[cipher]
+        for module_name in ["cryptography.hazmat.decrepit.ciphers.algorithms",
+                            "cryptography.hazmat.primitives.ciphers.algorithms"]:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                continue
+            if hasattr(module, name):
+                return getattr(module, name)
+        raise ImportError("cryptography provides no {}".format(name))
+
+    def supports(self, cipher: str, key_bytes: int) -> bool:
+        if cipher not in self.ALGORITHMS:
+            return False
+        try:
+            return key_bytes * 8 in self._algorithm(cipher).key_sizes
+        except ImportError:
+            return False
+
+    def new(self, cipher: str, key: bytes, iv: Optional[bytes] = None) -> Cipher:
+        from cryptography.hazmat.primitives import ciphers  # pylint: disable=import-outside-toplevel
+
+        algorithm = self._algorithm(cipher)(key)
+        mode = ciphers.modes.ECB() if iv is None else ciphers.modes.CBC(iv)
+        return CryptographyCipher(ciphers.Cipher(algorithm, mode), algorithm.block_size // 8)
+
+
+BACKENDS: Dict[str, Backend] = {}
+
+# (cipher, key bytes, bulk) -> backend picked by calibrate()
+_choices: Dict[Tuple[str, int, bool], Backend] = {}
+_choices_lock = threading.Lock()
+_override: Optional[str] = None
+
+# "cipher:key_bytes:bulk" -> backend name, as stored in choices_path()
+_stored_choices: Optional[Dict[str, str]] = None
+
+
+def register_backend(backend: Backend) -> None:
+    global _stored_choices  # pylint: disable=global-statement
+    BACKENDS[backend.name] = backend
+    _choices.clear()
+    _stored_choices = None
+
+
+def choices_path() -> str:
+    """File the calibration results are kept in, so that they survive
+    the process"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "pecryptfs", "cipher-backends.json")
+
+
+def _choices_key() -> str:
+    # calibrations are only valid for the same host and libraries
+    return " ".join([os.uname().nodename] + ["{}={}".format(name, backend.fingerprint())
+                                             for name, backend in sorted(BACKENDS.items())])
+
+
+def _load_choices() -> Dict[str, str]:
+    global _stored_choices  # pylint: disable=global-statement
+    if _stored_choices is None:
+        try:
+            with open(choices_path()) as fin:
+                content = json.load(fin)
+            if content["key"] != _choices_key():
+                raise ValueError("outdated")
+            _stored_choices = {str(k): str(v) for k, v in content["choices"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            _stored_choices = {}
+    return _stored_choices
+
+
+def _store_choice(name: str, backend: Backend) -> None:
+    """Add backend to the stored choices, failures are ignored, the
+    only cost is calibrating again in the next process"""
+    choices = _load_choices()
+    choices[name] = backend.name
+
+    path = choices_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmpfile = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, "w") as fout:
+            json.dump({"key": _choices_key(), "choices": choices}, fout)
+        os.replace(tmpfile, path)
+    except OSError:
+        try:
+            os.unlink(tmpfile)
+        except OSError:
+            pass
+
+
+def set_backend(name: Optional[str]) -> None:
+    """Use the backend name for all ciphers it supports, None goes back
+    to picking the fastest one. Overrides PECRYPTFS_CIPHER_BACKEND."""
+    global _override  # pylint: disable=global-statement
+    if name is not None and name not in BACKENDS:
+        raise ValueError("unknown cipher backend: {}".format(name))
+    _override = name
+    _choices.clear()
+
+
+def calibrate(cipher: str, key_bytes: int, bulk: bool = False) -> Dict[str, float]:
+    """Seconds per call of every backend supporting cipher, the best of
+    a few calls on CALIBRATION_SIZES[bulk] bytes"""
+    cipher = canonical_name(cipher)
+    key = bytes(range(1, key_bytes + 1))
+    data = bytes(CALIBRATION_SIZES[bulk])
+
+    result = {}
+    for backend in BACKENDS.values():
+        if not backend.supports(cipher, key_bytes):
+            continue
+
+        ecb = backend.new(cipher, key)
+        ecb.decrypt(data)
+        best = float("inf")
+        for _ in range(CALIBRATION_CALLS[bulk]):
+            start = time.perf_counter()
+            ecb.decrypt(data)
+            best = min(best, time.perf_counter() - start)
+        result[backend.name] = best
+    return result
+
+
+def get_backend(cipher: str, key_bytes: int, bulk: bool = False) -> Backend:
+    """The backend to use for cipher, the fastest one on this host
+    unless overridden. The choice is stored in choices_path() and only
+    made again when the host or the installed libraries change."""
+    cipher = canonical_name(cipher)
+    choice = _choices.get((cipher, key_bytes, bulk))
+    if choice is not None:
+        return choice
+
+    with _choices_lock:
+        override = _override or os.environ.get(BACKEND_ENV) or None
+        if override is not None:
+            backend = BACKENDS.get(override)
+            if backend is None:
+                raise ValueError("unknown cipher backend: {}".format(override))
+            if not backend.supports(cipher, key_bytes):
+                raise ValueError("cipher backend {} doesn't support {}:{}".format(override, cipher, key_bytes))
+            choice = backend
+        else:
+            name = "{}:{}:{}".format(cipher, key_bytes, "bulk" if bulk else "small")
+            # only the stored backend gets imported
+            choice = BACKENDS.get(_load_choices().get(name, ""))
+            if choice is None or not choice.supports(cipher, key_bytes):
+                candidates = [backend for backend in BACKENDS.values() if backend.supports(cipher, key_bytes)]
+                if not candidates:
+                    raise ValueError("no backend for cipher: {}:{}".format(cipher, key_bytes))
+                if len(candidates) == 1:
+                    choice = candidates[0]
+                else:
+                    timings = calibrate(cipher, key_bytes, bulk)
+                    choice = BACKENDS[min(timings, key=timings.__getitem__)]
+                _store_choice(name, choice)
+
+        _choices[(cipher, key_bytes, bulk)] = choice
+        return choice
+
+
+def new_cipher(cipher: str, key: bytes, iv: Optional[bytes] = None, bulk: bool = False) -> Cipher:
+    """Create an ECB cipher, or a CBC one when iv is given, with the
+    backend that is fastest for single blocks or with bulk for large
+    amounts of data"""
+    cipher = canonical_name(cipher)
+    return get_backend(cipher, len(key), bulk).new(cipher, key, iv)
+
+
+register_backend(PyCryptodomeBackend())
+register_backend(CryptographyBackend())
+
+
+# EOF #
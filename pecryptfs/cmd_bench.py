@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Any, Dict, Optional
+
+import argparse
+import json
+import sys
+
+from pecryptfs.bench import DEFAULT_TOLERANCE, compare, parameter_mismatches, run
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark key derivation, filename and content decryption")
+    parser.add_argument('-s', '--size', metavar='MIB', type=float, default=16,
+                        help='Size of the synthetic files read per cipher, defaults to 16 MiB')
+    parser.add_argument('-r', '--repeat', metavar='N', type=int, default=5,
+                        help='Number of timed runs of the key derivation and file benchmarks')
+    parser.add_argument('-n', '--names', metavar='N', type=int, default=2000,
+                        help='Number of filenames for the filename benchmarks')
+    parser.add_argument('--only', metavar='GLOB', type=str, default=None,
+                        help='Only run benchmarks matching GLOB, e.g. "file_read_aes_*"')
+    parser.add_argument('-o', '--output', metavar='FILE', type=str, default=None,
+                        help='Write the JSON report to FILE instead of stdout, it can serve as baseline')
+    parser.add_argument('-b', '--baseline', metavar='FILE', type=str, default=None,
+                        help='Compare against a previous report and fail on regressions')
+    parser.add_argument('-t', '--tolerance', metavar='FRACTION', type=float, default=DEFAULT_TOLERANCE,
+                        help='Slowdown relative to the baseline that is accepted, defaults to {}'.format(
+                            DEFAULT_TOLERANCE))
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print each benchmark as it starts')
+    return parser.parse_args(args)
+
+
+def load_baseline(args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    """Read --baseline, exits when it was run with other parameters, as
+    that would show up as bogus regressions or improvements"""
+    if args.baseline is None:
+        return None
+
+    with open(args.baseline) as fin:
+        baseline: Dict[str, Any] = json.load(fin)
+
+    mismatches = parameter_mismatches({"file_size": int(args.size * 2**20), "repeat": args.repeat,
+                                       "names": args.names}, baseline)
+    if mismatches:
+        print("error: {} was run with other parameters: {}".format(args.baseline, ", ".join(mismatches)),
+              file=sys.stderr)
+        sys.exit(2)
+    return baseline
+
+
+def main(argv: list[str]) -> None:
+    args = parse_args(argv[1:])
+    baseline = load_baseline(args)
+
+    def progress(name: str) -> None:
+        if args.verbose:
+            print("running {}".format(name), file=sys.stderr)
+
+    report = run(int(args.size * 2**20), args.repeat, args.names, args.only, progress)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as fout:
+            fout.write(text + "\n")
+
+    for name, result in report["results"].items():
+        if "error" in result:
+            print("warning: {} failed: {}".format(name, result["error"]), file=sys.stderr)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print("REGRESSION: {}".format(regression), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+def pip_main() -> None:
+    main(sys.argv)
+
+
+# EOF #
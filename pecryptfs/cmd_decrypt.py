@@ -23,6 +23,8 @@ import sys
 
 import pecryptfs
 from pecryptfs import b2h
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
+from pecryptfs.stats import command_stats
 
 
 def main() -> None:
@@ -35,10 +37,16 @@ def main() -> None:
                                   'which can be recovered with "ecryptfs-unwrap-passphrase '
                                   '.ecryptfs/wrapped-passphrase"'))
     auth_group.add_argument('-s', '--salt', type=str, help='Salt to use for decryption', default="0011223344556677")
-    auth_group.add_argument('-c', '--cipher', type=str, help='Cipher to use for encryption', default="aes")
-    auth_group.add_argument('-k', '--key-bytes', metavar='BYTES', type=int, default=16,
-                            help='Number of bytes in the encryption key')
+    auth_group.add_argument('-c', '--cipher', type=str,
+                            help='Cipher of the files, read from the file headers by default')
+    auth_group.add_argument('-k', '--key-bytes', metavar='BYTES', type=int,
+                            help='Number of bytes in the encryption key, read from the file headers by default')
+    add_key_cache_arguments(auth_group)
     parser.add_argument('-i', '--info', action="store_true", help="Print info about the file")
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=1,
+                        help='Number of threads used for decryption')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print the time spent in each stage to stderr at exit')
     args = parser.parse_args()
 
     if args.password is None:
@@ -46,19 +54,24 @@ def main() -> None:
     else:
         password = args.password
 
-    auth_token = pecryptfs.AuthToken(password, args.salt)
+    auth_token = pecryptfs.AuthToken(password, args.salt, key_cache=KeyCache.from_env(args.key_cache))
+
+    stats = command_stats(args.stats, auth_token)
 
     for filename in args.files:
         if args.info:
-            with pecryptfs.File.from_file(filename, auth_token, args.cipher, key_bytes=args.key_bytes) as efin:
+            with pecryptfs.File.from_file(filename, auth_token, args.cipher, key_bytes=args.key_bytes,
+                                          stats=stats) as efin:
                 print("session key:", b2h(auth_token.session_key[0:16]))
                 print("            ", b2h(auth_token.session_key[16:16+16]))
                 print("            ", b2h(auth_token.session_key[32:32+16]))
                 print("            ", b2h(auth_token.session_key[48:48+16]))
                 print("signature:", auth_token.signature_text)
         else:
-            with pecryptfs.File.from_file(filename, auth_token, args.cipher, args.key_bytes) as efin:
-                sys.stdout.buffer.write(efin.read())  # pylint: disable=no-member
+            with pecryptfs.File.from_file(filename, auth_token, args.cipher, args.key_bytes,
+                                          workers=args.jobs, stats=stats) as efin:
+                for data in efin.iter_extents():
+                    sys.stdout.buffer.write(data)  # pylint: disable=no-member
 
 
 # EOF #
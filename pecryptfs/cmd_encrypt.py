@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import argparse
+import getpass
+import os
+import shutil
+import sys
+
+import pecryptfs
+from pecryptfs.file import FileWriter
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="eCryptfs file encrypter")
+    parser.add_argument('files', metavar='FILE', type=str, nargs='+', help='Files to encrypt')
+    parser.add_argument('-o', '--output', metavar='DIR', type=str,
+                        help='Output directory, a single FILE is written to stdout when none given')
+    parser.add_argument('-n', '--encrypt-filenames', action='store_true',
+                        help='Store the output files under their encrypted filenames')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Be more verbose')
+
+    auth_group = parser.add_argument_group("Authentication / Cipher")
+    auth_group.add_argument('-p', '--password', type=str, help='Password to use for encryption, prompt when none given')
+    auth_group.add_argument('-s', '--salt', type=str, help='Salt to use for encryption', default="0011223344556677")
+    auth_group.add_argument('-c', '--cipher', type=str, help='Cipher to use for encryption', default="aes")
+    auth_group.add_argument('-k', '--key-bytes', metavar='BYTES', type=int, default=16,
+                            help='Number of bytes in the encryption key')
+    add_key_cache_arguments(auth_group)
+
+    return parser.parse_args(args)
+
+
+def main(argv: list[str]) -> None:
+    args = parse_args(argv[1:])
+
+    if args.output is None and len(args.files) != 1:
+        raise RuntimeError("--output is required when encrypting more than one file")
+
+    if args.password is None:
+        password = getpass.getpass()
+    else:
+        password = args.password
+
+    auth_token = pecryptfs.AuthToken(password, args.salt, key_cache=KeyCache.from_env(args.key_cache))
+    codec = pecryptfs.FilenameCodec(auth_token, args.cipher, args.key_bytes)
+
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+
+    for filename in args.files:
+        with open(filename, "rb") as fin:
+            if args.output is None:
+                # stdout can't seek back to fill in the size, so announce it upfront
+                fout = FileWriter(sys.stdout.buffer, auth_token, args.cipher, args.key_bytes,
+                                  file_size=os.fstat(fin.fileno()).st_size, closefd=False)
+            else:
+                basename = os.path.basename(filename)
+                if args.encrypt_filenames:
+                    basename = codec.encrypt(basename)
+                output = os.path.join(args.output, basename)
+                fout = FileWriter.from_file(output, auth_token, args.cipher, args.key_bytes)
+
+                if args.verbose:
+                    print("{} -> {}".format(filename, output))
+
+            with fout:
+                shutil.copyfileobj(fin, fout)
+
+
+def pip_main() -> None:
+    main(sys.argv)
+
+
+# EOF #
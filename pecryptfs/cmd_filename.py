@@ -17,6 +17,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
 import argparse
 import getpass
 import sys
@@ -24,8 +26,8 @@ import os
 import io
 
 import pecryptfs
-from pecryptfs.filename import encrypt_filename, decrypt_filename
-from pecryptfs.ecryptfs import encrypt_filename_ecryptfs, decrypt_filename_ecryptfs
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
+from pecryptfs.stats import command_stats
 from pecryptfs.define import ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX
 
 
@@ -39,6 +41,8 @@ def parse_args() -> argparse.Namespace:
                         help='Rename files to their encrypted/decrypted names')
     parser.add_argument('-f', '--force', action='store_true',
                         help='Perform encryption even if the filename is already encrypted')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print the time spent in each stage to stderr at exit')
 
     auth_group = parser.add_argument_group("Authentication / Cipher")
     auth_group.add_argument('-p', '--password', type=str, help='Password to use for decryption, prompt when none given')
@@ -46,6 +50,7 @@ def parse_args() -> argparse.Namespace:
     auth_group.add_argument('-c', '--cipher', type=str, help='Cipher to use for encryption', default="aes")
     auth_group.add_argument('-k', '--key-bytes', metavar='BYTES', type=int, default=16,
                             help='Number of bytes in the encryption key')
+    add_key_cache_arguments(auth_group)
 
     action_group = parser.add_argument_group("Action").add_mutually_exclusive_group()
     action_group.add_argument('-a', '--auto', action='store_true', help='Encrypt or decrypt filenames (default)')
@@ -55,6 +60,13 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def check_mapping(mapping: Dict[str, str], filenames: List[str], action: str) -> None:
+    """Raise a RuntimeError for filenames ecryptfs didn't convert"""
+    missing = [filename for filename in filenames if filename not in mapping]
+    if missing:
+        raise RuntimeError("ecryptfs failed to {}: {}".format(action, ", ".join(missing)))
+
+
 def main() -> None:
     # Python 3.5.2 still doesn't have "surrogateescape" enabled by
     # default on stdout/stderr, so we have to do it manually. Test with:
@@ -74,14 +86,39 @@ def main() -> None:
 
     salt = args.salt
 
+    auth_token = pecryptfs.AuthToken(password, salt, key_cache=KeyCache.from_env(args.key_cache))
+
+    stats = command_stats(args.stats, auth_token)
+
+    encrypt_many: Callable[[Iterable[str]], Iterator[str]]
+    decrypt_many: Callable[[Iterable[str]], Iterator[str]]
     if args.native:
-        encrypt = encrypt_filename_ecryptfs
-        decrypt = decrypt_filename_ecryptfs
+        # pylint: disable=import-outside-toplevel
+        from pecryptfs.ecryptfs import encrypt_filenames_ecryptfs, decrypt_filenames_ecryptfs
+
+        # a single mount handles all filenames of one direction
+        def encrypt_many(filenames: Iterable[str]) -> Iterator[str]:
+            filenames = list(filenames)
+            if not filenames:
+                return iter([])
+            mapping = encrypt_filenames_ecryptfs(filenames, auth_token, args.cipher, args.key_bytes)
+            check_mapping(mapping, filenames, "encrypt")
+            return (mapping[filename] for filename in filenames)
+
+        def decrypt_many(filenames: Iterable[str]) -> Iterator[str]:
+            filenames = list(filenames)
+            if not filenames:
+                return iter([])
+            mapping = decrypt_filenames_ecryptfs(filenames, auth_token, key_bytes=args.key_bytes)
+            check_mapping(mapping, filenames, "decrypt")
+            return (mapping[filename] for filename in filenames)
     else:
-        encrypt = encrypt_filename
-        decrypt = decrypt_filename
+        codec = pecryptfs.FilenameCodec(auth_token, args.cipher, args.key_bytes, stats=stats)
+        encrypt_many = codec.encrypt_many
+        decrypt_many = codec.decrypt_many
 
-    auth_token = pecryptfs.AuthToken(password, salt)
+    # (dirname, filename, encrypt)
+    actions: list[Tuple[str, str, bool]] = []
 
     for path in args.files:
         dirname = os.path.dirname(path)
@@ -92,20 +129,23 @@ def main() -> None:
                 if args.verbose:
                     print("already encrypted, ignoring {}".format(filename))
                 continue
-            new_filename = encrypt(filename, auth_token, args.cipher, args.key_bytes)
+            actions.append((dirname, filename, True))
         elif args.decrypt:
             if not filename.startswith(ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX):
                 if args.verbose:
                     print("missing FNEK marker, ignoring {}".format(filename))
                 continue
-            new_filename = decrypt(filename, auth_token, key_bytes=args.key_bytes)
+            actions.append((dirname, filename, False))
         else:  # auto
             # FIXME: toggling per filename is a bad idea, should be
             # either all decrypt or all encrypt
-            if filename.startswith(ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX):
-                new_filename = decrypt(filename, auth_token, key_bytes=args.key_bytes)
-            else:
-                new_filename = encrypt(filename, auth_token, args.cipher, args.key_bytes)
+            actions.append((dirname, filename, not filename.startswith(ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX)))
+
+    encrypted = encrypt_many(filename for _, filename, encrypt in actions if encrypt)
+    decrypted = decrypt_many(filename for _, filename, encrypt in actions if not encrypt)
+
+    for dirname, filename, encrypt in actions:
+        new_filename = next(encrypted) if encrypt else next(decrypted)
 
         if args.move:
             if filename != new_filename:
@@ -22,6 +22,8 @@ import getpass
 import os
 
 import pecryptfs
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
+from pecryptfs.stats import command_stats
 
 
 def main() -> None:
@@ -29,7 +31,15 @@ def main() -> None:
     parser.add_argument('files', metavar='FILE', type=str, nargs='+', help='Filenames to decrypt')
     parser.add_argument('-p', '--password', type=str, help='Password to use for decryption, prompt when none given')
     parser.add_argument('-s', '--salt', type=str, help='Salt to use for decryption', default="0011223344556677")
+    add_key_cache_arguments(parser)
     parser.add_argument('-d', '--directory', action='store_true', help='List content of directory')
+    parser.add_argument('--index', action='store_true',
+                        help='Keep the decrypted names of directories in an SQLite database, unchanged '
+                        'directories are not decrypted again')
+    parser.add_argument('--index-db', metavar='PATH', type=str, default=None,
+                        help='Database to use with --index (default: $XDG_CACHE_HOME/pecryptfs/filenames.sqlite)')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print the time spent in each stage to stderr at exit')
     args = parser.parse_args()
 
     if args.password is None:
@@ -37,16 +47,27 @@ def main() -> None:
     else:
         password = args.password
 
-    auth_token = pecryptfs.AuthToken(password, args.salt)
+    auth_token = pecryptfs.AuthToken(password, args.salt, key_cache=KeyCache.from_env(args.key_cache))
 
-    if args.directory:
+    stats = command_stats(args.stats, auth_token)
+
+    codec = pecryptfs.FilenameCodec(auth_token, stats=stats)
+
+    if args.directory and args.index:
+        # sqlite3 is slow to import and only needed here
+        from pecryptfs.filename_index import SqliteFilenameIndex  # pylint: disable=import-outside-toplevel
+
+        with SqliteFilenameIndex(args.index_db or SqliteFilenameIndex.default_path(), codec) as index:
+            for directory in args.files:
+                for filename, real_filename in index.listdir(directory).items():
+                    print("{} -> {}".format(real_filename, filename))
+    elif args.directory:
         for directory in args.files:
-            for filename in os.listdir(directory):
-                real_filename = pecryptfs.decrypt_filename(filename, auth_token)
+            filenames = os.listdir(directory)
+            for filename, real_filename in zip(filenames, codec.decrypt_many(filenames)):
                 print("{} -> {}".format(real_filename, filename))
     else:
-        for filename in args.files:
-            real_filename = pecryptfs.decrypt_filename(filename, auth_token)
+        for filename, real_filename in zip(args.files, codec.decrypt_many(args.files)):
             print("{} -> {}".format(real_filename, filename))
 
 
@@ -17,11 +17,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from typing import IO, Iterator
+
 import argparse
 import getpass
+import os
 import sys
+import time
 
 import pecryptfs
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
 
 
 def parse_args(args: list[str]) -> argparse.Namespace:
@@ -31,13 +36,56 @@ def parse_args(args: list[str]) -> argparse.Namespace:
     auth_group = parser.add_argument_group("Authentication / Cipher")
     auth_group.add_argument('-p', '--password', type=str, help='Password to use for decryption, prompt when none given')
     auth_group.add_argument('-s', '--salt', type=str, help='Salt to use for decryption', default="0011223344556677")
+    add_key_cache_arguments(auth_group)
+
+    bulk_group = parser.add_argument_group("Bulk password search")
+    bulk_group.add_argument('--candidates', metavar='FILE', type=str,
+                            help='Try every line of FILE ("-" for stdin) as password and print the one '
+                            'matching --signature')
+    bulk_group.add_argument('--signature', metavar='SIG', type=str,
+                            help='Signature to search for, as found in ".ecryptfs/Private.sig"')
+    bulk_group.add_argument('-j', '--jobs', metavar='N', type=int, default=None,
+                            help='Number of worker processes, defaults to the number of cores')
+
+    result = parser.parse_args(args)
+    if result.candidates is not None and result.signature is None:
+        parser.error("--candidates requires --signature")
+    return result
 
-    return parser.parse_args(args)
+
+def read_candidates(fin: IO[bytes]) -> Iterator[str]:
+    for line in fin:
+        yield os.fsdecode(line.rstrip(b"\r\n"))
+
+
+def find_password(args: argparse.Namespace) -> None:
+    start = time.perf_counter()
+    if args.candidates == "-":
+        password, tried = pecryptfs.AuthToken.find_password(read_candidates(sys.stdin.buffer), args.signature,
+                                                            args.salt, workers=args.jobs)
+    else:
+        with open(args.candidates, "rb") as fin:
+            password, tried = pecryptfs.AuthToken.find_password(read_candidates(fin), args.signature,
+                                                                args.salt, workers=args.jobs)
+    elapsed = time.perf_counter() - start
+
+    print("tried {} candidates in {:.2f} seconds, {:.1f} candidates/sec".format(
+        tried, elapsed, tried / elapsed if elapsed > 0 else 0.0), file=sys.stderr)
+
+    if password is None:
+        print("error: no candidate matches signature {}".format(args.signature), file=sys.stderr)
+        sys.exit(1)
+
+    print(password)
 
 
 def main(argv: list[str]) -> None:
     args = parse_args(argv[1:])
 
+    if args.candidates is not None:
+        find_password(args)
+        return
+
     if args.password is None:
         password = getpass.getpass()
     else:
@@ -45,7 +93,7 @@ def main(argv: list[str]) -> None:
 
     salt = args.salt
 
-    auth_token = pecryptfs.AuthToken(password, salt)
+    auth_token = pecryptfs.AuthToken(password, salt, key_cache=KeyCache.from_env(args.key_cache))
 
     print(auth_token.signature_text)
 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import argparse
+import getpass
+import sys
+
+import pecryptfs
+from pecryptfs.extent_cache import DEFAULT_MAX_BYTES, ExtentCache
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
+from pecryptfs.mount import MountOperations
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mount an eCryptfs encrypted directory read-only via FUSE")
+    parser.add_argument('directory', metavar='DIR', type=str, help='Encrypted directory, e.g. ".Private"')
+    parser.add_argument('mountpoint', metavar='MOUNTPOINT', type=str, help='Where to show the decrypted tree')
+    parser.add_argument('-f', '--foreground', action='store_true', help='Stay in the foreground')
+    parser.add_argument('--cache-size', metavar='MIB', type=int, default=DEFAULT_MAX_BYTES // 2**20,
+                        help='Memory used for decrypted extents, defaults to {} MiB'.format(DEFAULT_MAX_BYTES // 2**20))
+
+    auth_group = parser.add_argument_group("Authentication / Cipher")
+    auth_group.add_argument('-p', '--password', type=str, help='Password to use for decryption, prompt when none given')
+    auth_group.add_argument('-s', '--salt', type=str, help='Salt to use for decryption', default="0011223344556677")
+    auth_group.add_argument('-c', '--cipher', type=str, help='Cipher of the encrypted filenames, the cipher of '
+                            'the file content is read from the file headers', default="aes")
+    auth_group.add_argument('-k', '--key-bytes', metavar='BYTES', type=int, default=16,
+                            help='Number of bytes in the filename encryption key')
+    add_key_cache_arguments(auth_group)
+
+    return parser.parse_args(args)
+
+
+def main(argv: list[str]) -> None:
+    args = parse_args(argv[1:])
+
+    try:
+        import fuse  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        print("error: pecryptfs-mount requires fusepy, install it with 'pip install fusepy'", file=sys.stderr)
+        sys.exit(1)
+
+    if args.password is None:
+        password = getpass.getpass()
+    else:
+        password = args.password
+
+    auth_token = pecryptfs.AuthToken(password, args.salt, key_cache=KeyCache.from_env(args.key_cache))
+    _ = auth_token.session_key
+
+    class FuseOperations(MountOperations, fuse.Operations):  # type: ignore
+        pass
+
+    operations = FuseOperations(args.directory, auth_token, args.cipher, args.key_bytes,
+                                ExtentCache(args.cache_size * 2**20))
+    fuse.FUSE(operations, args.mountpoint, foreground=args.foreground, ro=True, nothreads=False)
+
+
+def pip_main() -> None:
+    main(sys.argv)
+
+
+# EOF #
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Optional, Tuple
+
+import argparse
+import getpass
+import os
+import queue
+import struct
+import sys
+import threading
+
+import pecryptfs
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Restore a whole eCryptfs encrypted directory tree")
+    parser.add_argument('source', metavar='SRC', type=str, help='Encrypted directory, e.g. ".Private"')
+    parser.add_argument('destination', metavar='DST', type=str, help='Directory to write the decrypted tree to')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Be more verbose')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=os.cpu_count() or 1,
+                        help='Number of files decrypted in parallel, defaults to the number of cores')
+
+    auth_group = parser.add_argument_group("Authentication / Cipher")
+    auth_group.add_argument('-p', '--password', type=str, help='Password to use for decryption, prompt when none given')
+    auth_group.add_argument('-s', '--salt', type=str, help='Salt to use for decryption', default="0011223344556677")
+    auth_group.add_argument('-c', '--cipher', type=str,
+                            help='Cipher of the files, read from the file headers by default')
+    auth_group.add_argument('-k', '--key-bytes', metavar='BYTES', type=int,
+                            help='Number of bytes in the encryption key, read from the file headers by default')
+    add_key_cache_arguments(auth_group)
+
+    return parser.parse_args(args)
+
+
+def is_complete(src_path: str, dst_path: str) -> bool:
+    """Outputs are only renamed into place once fully written, so an
+    existing output of the right size is a finished one"""
+    try:
+        dst_size = os.path.getsize(dst_path)
+    except FileNotFoundError:
+        return False
+
+    with open(src_path, "rb") as fin:
+        header = fin.read(8)
+    if len(header) != 8:
+        return False
+
+    file_size: int = struct.unpack(">q", header)[0]
+    return dst_size == file_size
+
+
+def restore_file(src_path: str, dst_path: str, auth_token: pecryptfs.AuthToken,
+                 cipher: Optional[str] = None, key_bytes: Optional[int] = None) -> None:
+    tmp_path = dst_path + ".pecryptfs-part"
+    with pecryptfs.File.from_file(src_path, auth_token, cipher, key_bytes) as efin:
+        with open(tmp_path, "wb") as fout:
+            for data in efin.iter_extents():
+                fout.write(data)
+    os.replace(tmp_path, dst_path)
+
+
+class Restore:
+
+    def __init__(self, args: argparse.Namespace, auth_token: pecryptfs.AuthToken) -> None:
+        self.args = args
+        self.auth_token = auth_token
+        # decrypting names takes the cipher from the name itself, only
+        # Blowfish needs the key size
+        self.codec = pecryptfs.FilenameCodec(auth_token, args.cipher or "aes", args.key_bytes or 16)
+
+        # bounded, so that walking the tree doesn't run ahead of the workers
+        self.queue: 'queue.Queue[Optional[Tuple[str, str]]]' = queue.Queue(maxsize=4 * args.jobs)
+
+        self.lock = threading.Lock()
+        self.errors = 0
+
+    def log(self, text: str) -> None:
+        with self.lock:
+            print(text)
+
+    def error(self, text: str) -> None:
+        with self.lock:
+            print("error: {}".format(text), file=sys.stderr)
+            self.errors += 1
+
+    def worker(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            src_path, dst_path = item
+            try:
+                if is_complete(src_path, dst_path):
+                    if self.args.verbose:
+                        self.log("skipping {}, already complete".format(dst_path))
+                    continue
+
+                restore_file(src_path, dst_path, self.auth_token, self.args.cipher, self.args.key_bytes)
+                if self.args.verbose:
+                    self.log("{} -> {}".format(src_path, dst_path))
+            except Exception as err:  # pylint: disable=broad-except
+                self.error("{}: {}".format(src_path, err))
+
+    def decrypt_name(self, src_dir: str, name: str) -> Optional[str]:
+        try:
+            plain_name = self.codec.decrypt(name)
+        except (ValueError, AssertionError) as err:
+            self.error("{}: failed to decrypt filename: {}".format(os.path.join(src_dir, name), err))
+            return None
+
+        # a crafted name must not lead outside of the destination
+        if plain_name in ("", ".", "..") or "/" in plain_name or "\0" in plain_name:
+            self.error("{}: unsafe decrypted filename {!r}, skipping".format(os.path.join(src_dir, name), plain_name))
+            return None
+
+        return plain_name
+
+    def restore_symlink(self, src_path: str, dst_path: str) -> None:
+        """Recreate the symlink at src_path with its target decrypted"""
+        try:
+            target = self.codec.decrypt(os.readlink(src_path))
+        except (ValueError, AssertionError) as err:
+            self.error("{}: failed to decrypt symlink target: {}".format(src_path, err))
+            return
+
+        if os.path.islink(dst_path):
+            if os.readlink(dst_path) == target:
+                return
+            os.unlink(dst_path)
+        elif os.path.lexists(dst_path):
+            self.error("{}: {} exists and is not a symlink".format(src_path, dst_path))
+            return
+
+        os.symlink(target, dst_path)
+        if self.args.verbose:
+            self.log("{} -> {} (symlink to {})".format(src_path, dst_path, target))
+
+    def walk(self) -> None:
+        # the walk happens over the encrypted names, this maps them to
+        # the decrypted output directories
+        dst_dirs = {self.args.source: self.args.destination}
+        os.makedirs(self.args.destination, exist_ok=True)
+
+        for src_dir, dirnames, filenames in os.walk(self.args.source):
+            dst_dir = dst_dirs.pop(src_dir)
+
+            for dirname in list(dirnames):
+                plain_dirname = self.decrypt_name(src_dir, dirname)
+                if plain_dirname is None:
+                    dirnames.remove(dirname)
+                    continue
+
+                # os.walk() lists symlinks to directories, but doesn't follow them
+                if os.path.islink(os.path.join(src_dir, dirname)):
+                    dirnames.remove(dirname)
+                    self.restore_symlink(os.path.join(src_dir, dirname), os.path.join(dst_dir, plain_dirname))
+                    continue
+
+                dst_dirs[os.path.join(src_dir, dirname)] = os.path.join(dst_dir, plain_dirname)
+                os.makedirs(os.path.join(dst_dir, plain_dirname), exist_ok=True)
+
+            for filename in filenames:
+                src_path = os.path.join(src_dir, filename)
+                plain_filename = self.decrypt_name(src_dir, filename)
+                if plain_filename is None:
+                    continue
+
+                if os.path.islink(src_path):
+                    self.restore_symlink(src_path, os.path.join(dst_dir, plain_filename))
+                    continue
+
+                if not os.path.isfile(src_path):
+                    self.error("{}: not a regular file, skipping".format(src_path))
+                    continue
+
+                self.queue.put((src_path, os.path.join(dst_dir, plain_filename)))
+
+    def run(self) -> int:
+        # derive the key once, before the workers need it
+        _ = self.auth_token.session_key
+
+        workers = [threading.Thread(target=self.worker) for _ in range(max(1, self.args.jobs))]
+        for thread in workers:
+            thread.start()
+
+        try:
+            self.walk()
+        finally:
+            for _ in workers:
+                self.queue.put(None)
+            for thread in workers:
+                thread.join()
+
+        return self.errors
+
+
+def main(argv: list[str]) -> None:
+    args = parse_args(argv[1:])
+
+    if args.password is None:
+        password = getpass.getpass()
+    else:
+        password = args.password
+
+    auth_token = pecryptfs.AuthToken(password, args.salt, key_cache=KeyCache.from_env(args.key_cache))
+
+    errors = Restore(args, auth_token).run()
+    if errors:
+        print("{} errors".format(errors), file=sys.stderr)
+        sys.exit(1)
+
+
+def pip_main() -> None:
+    main(sys.argv)
+
+
+# EOF #
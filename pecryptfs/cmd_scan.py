@@ -0,0 +1,105 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from pecryptfs.header import HEADER_FIELDS, FileHeader
+
+
+# number of paths handed to the thread pool at once, keeps memory use
+# constant for arbitrarily large trees
+SCAN_BATCH_SIZE = 1024
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="List the header metadata of eCryptfs encrypted files, "
+                                     "no password required")
+    parser.add_argument('files', metavar='FILE', type=str, nargs='+',
+                        help='Encrypted files or directories to scan recursively')
+    parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json',
+                        help='Output one JSON object per line (default) or CSV')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=None,
+                        help='Number of headers read in parallel')
+    return parser.parse_args(args)
+
+
+def iter_paths(paths: Iterable[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for filename in filenames:
+                    yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def scan_file(path: str) -> Dict[str, Any]:
+    """Returns the header fields of path, or an error description"""
+    result: Dict[str, Any] = {"path": path}
+    try:
+        result["lower_size"] = os.path.getsize(path)
+        result.update(FileHeader.from_path(path).to_dict())
+    except (OSError, RuntimeError) as err:
+        result["error"] = str(err)
+    return result
+
+
+def scan(paths: Iterable[str], jobs: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Scan all files below paths, the order of the results follows the
+    order of the walk"""
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        batch: list[str] = []
+        for path in iter_paths(paths):
+            batch.append(path)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                yield from executor.map(scan_file, batch)
+                batch = []
+        yield from executor.map(scan_file, batch)
+
+
+def main(argv: list[str]) -> None:
+    args = parse_args(argv[1:])
+
+    errors = 0
+    if args.format == 'csv':
+        writer = csv.DictWriter(sys.stdout, ["path", "lower_size"] + HEADER_FIELDS + ["error"])
+        writer.writeheader()
+        for result in scan(args.files, args.jobs):
+            errors += "error" in result
+            writer.writerow(result)
+    else:
+        for result in scan(args.files, args.jobs):
+            errors += "error" in result
+            print(json.dumps(result))
+
+    if errors:
+        print("{} files could not be scanned".format(errors), file=sys.stderr)
+        sys.exit(1)
+
+
+def pip_main() -> None:
+    main(sys.argv)
+
+
+# EOF #
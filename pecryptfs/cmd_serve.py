@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Any, Optional, Tuple
+
+import argparse
+import getpass
+import html
+import mimetypes
+import os
+import re
+import sys
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pecryptfs
+from pecryptfs.define import ECRYPTFS_DEFAULT_EXTENT_SIZE
+from pecryptfs.extent_cache import DEFAULT_MAX_BYTES, ExtentCache
+from pecryptfs.file import EXTENT_BATCH_SIZE
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
+
+
+# a whole batch of extents per write
+CHUNK_SIZE = EXTENT_BATCH_SIZE * ECRYPTFS_DEFAULT_EXTENT_SIZE
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve an eCryptfs encrypted directory tree read-only over HTTP")
+    parser.add_argument('directory', metavar='DIR', type=str, help='Encrypted directory, e.g. ".Private"')
+    parser.add_argument('-b', '--bind', metavar='ADDRESS', type=str, default='127.0.0.1',
+                        help='Address to listen on, defaults to 127.0.0.1')
+    parser.add_argument('-P', '--port', type=int, default=8000, help='Port to listen on, defaults to 8000')
+    parser.add_argument('--cache-size', metavar='MIB', type=int, default=DEFAULT_MAX_BYTES // 2**20,
+                        help='Memory used for decrypted extents, defaults to {} MiB'.format(DEFAULT_MAX_BYTES // 2**20))
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every request')
+
+    auth_group = parser.add_argument_group("Authentication / Cipher")
+    auth_group.add_argument('-p', '--password', type=str, help='Password to use for decryption, prompt when none given')
+    auth_group.add_argument('-s', '--salt', type=str, help='Salt to use for decryption', default="0011223344556677")
+    auth_group.add_argument('-c', '--cipher', type=str, help='Cipher of the encrypted filenames, the cipher of '
+                            'the file content is read from the file headers', default="aes")
+    auth_group.add_argument('-k', '--key-bytes', metavar='BYTES', type=int, default=16,
+                            help='Number of bytes in the filename encryption key')
+    add_key_cache_arguments(auth_group)
+
+    return parser.parse_args(args)
+
+
+def parse_range(value: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range, returns the first and last byte
+    position, or None when the header should be ignored. Raises
+    ValueError when the range can't be satisfied."""
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", value)
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+
+    if match.group(1) == "":
+        # suffix range, the last N bytes
+        length = int(match.group(2))
+        if length == 0:
+            raise ValueError("empty suffix range")
+        if file_size == 0:
+            raise ValueError("suffix range of an empty file")
+        return max(0, file_size - length), file_size - 1
+
+    first = int(match.group(1))
+    last = int(match.group(2)) if match.group(2) else file_size - 1
+    if match.group(2) and last < first:
+        return None
+    if first >= file_size:
+        raise ValueError("range starts behind the end of the file")
+
+    return first, min(last, file_size - 1)
+
+
+class Server(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], directory: str, auth_token: pecryptfs.AuthToken,
+                 cipher: str, key_bytes: int, cache: ExtentCache, verbose: bool = False) -> None:
+        super().__init__(address, RequestHandler)
+
+        self.directory = directory
+        self.auth_token = auth_token
+        self.cipher = cipher
+        self.key_bytes = key_bytes
+        self.codec = pecryptfs.FilenameCodec(auth_token, cipher, key_bytes)
+        self.cache = cache
+        self.verbose = verbose
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    # keep-alive, requires a Content-Length on every response
+    protocol_version = "HTTP/1.1"
+
+    server: Server
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self) -> None:
+        self.handle_request(send_body=True)
+
+    def do_HEAD(self) -> None:
+        self.handle_request(send_body=False)
+
+    def send_text(self, status: HTTPStatus, text: str, send_body: bool,
+                  content_type: str = "text/plain; charset=utf-8") -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def handle_request(self, send_body: bool) -> None:
+        url_path = urllib.parse.urlsplit(self.path).path
+        parts = [part for part in urllib.parse.unquote(url_path).split("/") if part]
+        if any(part in (".", "..") for part in parts):
+            self.send_text(HTTPStatus.BAD_REQUEST, "invalid path\n", send_body)
+            return
+
+        enc_path = self.encrypted_path(parts)
+        if enc_path is None:
+            self.send_text(HTTPStatus.NOT_FOUND, "not found\n", send_body)
+            return
+
+        if os.path.isdir(enc_path):
+            if not url_path.endswith("/"):
+                self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                self.send_header("Location", url_path + "/")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_listing(enc_path, "/" + "/".join(parts), send_body)
+        elif os.path.isfile(enc_path):
+            self.send_file(enc_path, parts[-1], send_body)
+        else:
+            self.send_text(HTTPStatus.NOT_FOUND, "not found\n", send_body)
+
+    def encrypted_path(self, parts: list[str]) -> Optional[str]:
+        """Returns the path of the lower file for the plain path parts,
+        or None when a part can't be encrypted"""
+        # filename encryption is deterministic, so the encrypted path
+        # can be computed without listing any directories
+        result = self.server.directory
+        for part in parts:
+            try:
+                enc_path = os.path.join(result, self.server.codec.encrypt(part))
+            except (ValueError, AssertionError):
+                return None
+
+            # unencrypted names, e.g. lost+found, show up unchanged
+            if not os.path.lexists(enc_path) and os.path.lexists(os.path.join(result, part)):
+                enc_path = os.path.join(result, part)
+            result = enc_path
+        return result
+
+    def send_listing(self, enc_path: str, plain_path: str, send_body: bool) -> None:
+        entries = []
+        for entry in os.scandir(enc_path):
+            try:
+                name = self.server.codec.decrypt(entry.name)
+            except (ValueError, AssertionError):
+                continue
+            entries.append(name + "/" if entry.is_dir() else name)
+
+        title = html.escape("Index of " + plain_path)
+        lines = ["<!DOCTYPE html>",
+                 "<html><head><meta charset=\"utf-8\"><title>{}</title></head><body>".format(title),
+                 "<h1>{}</h1>".format(title),
+                 "<ul>"]
+        for name in sorted(entries):
+            lines.append("<li><a href=\"{}\">{}</a></li>".format(urllib.parse.quote(name), html.escape(name)))
+        lines += ["</ul>", "</body></html>", ""]
+
+        self.send_text(HTTPStatus.OK, "\n".join(lines), send_body, "text/html; charset=utf-8")
+
+    def send_file(self, enc_path: str, name: str, send_body: bool) -> None:
+        try:
+            efs = pecryptfs.File.from_file(enc_path, self.server.auth_token, cache=self.server.cache)
+        except (OSError, RuntimeError, ValueError, AssertionError) as err:
+            self.send_text(HTTPStatus.INTERNAL_SERVER_ERROR, "{}\n".format(err), send_body)
+            return
+
+        with efs:
+            file_size = efs.file_size
+            first, last = 0, file_size - 1
+            status = HTTPStatus.OK
+
+            range_header = self.headers.get("Range")
+            if range_header is not None:
+                try:
+                    byte_range = parse_range(range_header, file_size)
+                except ValueError:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header("Content-Range", "bytes */{}".format(file_size))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if byte_range is not None:
+                    first, last = byte_range
+                    status = HTTPStatus.PARTIAL_CONTENT
+
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(last - first + 1))
+            if status == HTTPStatus.PARTIAL_CONTENT:
+                self.send_header("Content-Range", "bytes {}-{}/{}".format(first, last, file_size))
+            self.end_headers()
+
+            if send_body:
+                # only the extents overlapping the range get decrypted
+                efs.seek(first)
+                remaining = last - first + 1
+                while remaining > 0:
+                    data = efs.read(min(remaining, CHUNK_SIZE))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    remaining -= len(data)
+
+
+def main(argv: list[str]) -> None:
+    args = parse_args(argv[1:])
+
+    if args.password is None:
+        password = getpass.getpass()
+    else:
+        password = args.password
+
+    # derived once, shared by all requests
+    auth_token = pecryptfs.AuthToken(password, args.salt, key_cache=KeyCache.from_env(args.key_cache))
+    _ = auth_token.session_key
+
+    server = Server((args.bind, args.port), args.directory, auth_token, args.cipher, args.key_bytes,
+                    ExtentCache(args.cache_size * 2**20), verbose=args.verbose)
+    print("serving {} on http://{}:{}/".format(args.directory, *server.server_address[:2]), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.verbose:
+            print("extent cache: {}".format(server.cache.stats()), file=sys.stderr)
+
+
+def pip_main() -> None:
+    main(sys.argv)
+
+
+# EOF #
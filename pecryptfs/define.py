@@ -95,5 +95,18 @@ ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX = "ECRYPTFS_FNEK_ENCRYPTED."
 ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX_SIZE = 24
 ECRYPTFS_ENCRYPTED_DENTRY_NAME_LEN = 18 + 1 + 4 + 1 + 32
 
+# on-disk header flags, see ecryptfs/crypto.c:ecryptfs_flag_map
+ECRYPTFS_FLAG_ENABLE_HMAC = 0x00000001
+ECRYPTFS_FLAG_ENCRYPTED = 0x00000002
+ECRYPTFS_FLAG_METADATA_IN_XATTR = 0x00000004
+ECRYPTFS_FLAG_ENCRYPT_FILENAMES = 0x00000008
+ECRYPTFS_MINIMUM_HEADER_EXTENT_SIZE = 8192
+ECRYPTFS_DEFAULT_EXTENT_SIZE = 4096
+
+# RFC2440 string-to-key specifier written into Tag 3 packets
+RFC2440_S2K_SALTED_ITERATED = 0x03
+RFC2440_HASH_MD5 = 0x01
+RFC2440_S2K_COUNT_65536 = 0x60
+
 
 # EOF #
@@ -17,9 +17,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from typing import TYPE_CHECKING
+from typing import Dict, Iterable, Optional, Type, TYPE_CHECKING
+from types import TracebackType
 
 import os
+import shutil
 import subprocess
 import tempfile
 
@@ -27,137 +29,164 @@ if TYPE_CHECKING:
     from pecryptfs.auth_token import AuthToken  # noqa: F401
 
 
-def generate_encrypted_file(auth_token: 'AuthToken', cipher: str, key_bytes: str) -> bytes:
-    back_directory = tempfile.mkdtemp("_pecryptfs_back")
-    front_directory = tempfile.mkdtemp("_pecryptfs_front")
-
-    # mount the encrypted directory
-    cmd = ["sudo", "mount",
-           "-t", "ecryptfs",
-           "-o", ",".join(["key=passphrase:passwd={}".format(auth_token.password_text),
-                           "passphrase_salt={}".format(auth_token.salt_text),
-                           "ecryptfs_enable_filename_crypto=no",
-                           "ecryptfs_passthrough=no",
-                           "ecryptfs_unlink_sigs",
-                           "no_sig_cache",
-                           "ecryptfs_cipher={}".format(cipher),
-                           "ecryptfs_key_bytes={}".format(key_bytes)]),
-           back_directory,
-           front_directory]
+class EcryptfsMount:
+    """A native ecryptfs mount on a pair of temporary directories, used
+    as reference implementation. Mounting requires sudo and is slow, so
+    a single mount can process any number of filenames.
+
+    lower_files are created in the lower directory before mounting, as
+    ecryptfs must not be bypassed while mounted."""
+
+    def __init__(self, auth_token: 'AuthToken', cipher: str = "aes", key_bytes: int = 24,
+                 filename_crypto: bool = True, lower_files: Iterable[str] = ()) -> None:
+        self.auth_token = auth_token
+        self.cipher = cipher
+        self.key_bytes = key_bytes
+        self.filename_crypto = filename_crypto
+        self.lower_files = [os.fsdecode(filename) for filename in lower_files]
+
+        self.back_directory = ""
+        self.front_directory = ""
+
+        # inode number -> name of the files in lower_files
+        self.lower_inodes: Dict[int, str] = {}
+
+    def __enter__(self) -> 'EcryptfsMount':
+        self.back_directory = tempfile.mkdtemp("_pecryptfs_back")
+        self.front_directory = tempfile.mkdtemp("_pecryptfs_front")
+
+        # __exit__() isn't called when __enter__() fails
+        try:
+            for enc_filename in self.lower_files:
+                path = os.path.join(self.back_directory, enc_filename)
+                with open(path, "w") as fout:
+                    fout.write("Hello World\n")
+                self.lower_inodes[os.stat(path).st_ino] = enc_filename
+
+            options = ["key=passphrase:passwd={}".format(self.auth_token.password_text),
+                       "passphrase_salt={}".format(self.auth_token.salt_text)]
+            if self.filename_crypto:
+                options += ["ecryptfs_enable_filename_crypto=yes",
+                            "ecryptfs_passthrough=no",
+                            "ecryptfs_unlink_sigs",
+                            "ecryptfs_fnek_sig={}".format(self.auth_token.signature_text)]
+            else:
+                options += ["ecryptfs_enable_filename_crypto=no",
+                            "ecryptfs_passthrough=no",
+                            "ecryptfs_unlink_sigs"]
+            options += ["no_sig_cache",
+                        "ecryptfs_cipher={}".format(self.cipher),
+                        "ecryptfs_key_bytes={}".format(self.key_bytes)]
+
+            # mount the encrypted directory
+            cmd = ["sudo", "mount",
+                   "-t", "ecryptfs",
+                   "-o", ",".join(options),
+                   self.back_directory,
+                   self.front_directory]
+
+            with open(os.devnull, 'w') as devnull:
+                subprocess.check_call(cmd, stdout=devnull)
+        except BaseException:
+            shutil.rmtree(self.back_directory)
+            os.rmdir(self.front_directory)
+            raise
+
+        return self
+
+    def __exit__(self,  # pylint: disable=useless-return
+                 exc_type: Optional[Type[BaseException]],
+                 exc_value: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> Optional[bool]:
+        # unmount the encrypted diretorys
+        subprocess.check_call(["sudo", "umount", self.front_directory])
+
+        # FIXME: Why is the file not overwritten when it's not unlinked?!
+        shutil.rmtree(self.back_directory)
+        os.rmdir(self.front_directory)
+
+        return None
+
+    def encrypt_filenames(self, filenames: Iterable[str]) -> Dict[str, str]:
+        """Returns a mapping from plain to encrypted filenames"""
+        # ecryptfs inodes carry the inode number of the lower file,
+        # which connects the plain and the encrypted name
+        inodes: Dict[int, str] = {}
+        for filename in filenames:
+            filename = os.fsdecode(filename)
+            path = os.path.join(self.front_directory, filename)
+            with open(path, "w") as fout:
+                fout.write("Hello World\n")
+            inodes[os.stat(path).st_ino] = filename
+
+        result = {inodes[entry.inode()]: entry.name
+                  for entry in os.scandir(self.back_directory)
+                  if entry.inode() in inodes}
+
+        for filename in inodes.values():
+            os.unlink(os.path.join(self.front_directory, filename))
+
+        return result
+
+    def decrypt_filenames(self) -> Dict[str, str]:
+        """Returns a mapping from the encrypted lower_files to plain
+        filenames, names ecryptfs can't decrypt are missing"""
+        return {self.lower_inodes[entry.inode()]: entry.name
+                for entry in os.scandir(self.front_directory)
+                if entry.inode() in self.lower_inodes}
+
+    def write_file(self, filename: str, content: str) -> bytes:
+        """Write content to filename and return its encrypted form"""
+        path = os.path.join(self.front_directory, filename)
+        with open(path, "w") as fout:
+            fout.write(content)
+            # push the encrypted pages down to the lower file
+            fout.flush()
+            os.fsync(fout.fileno())
+        inode = os.stat(path).st_ino
+
+        for entry in os.scandir(self.back_directory):
+            if entry.inode() == inode:
+                with open(entry.path, "rb") as fin:
+                    data = fin.read()
+                break
+        else:
+            raise RuntimeError("{}: lower file not found".format(filename))
+
+        os.unlink(path)
+        return data
 
-    with open(os.devnull, 'w') as devnull:
-        subprocess.check_call(cmd, stdout=devnull)
 
-    # write file and let it be encrypted
-    with open(os.path.join(front_directory, "TestFile"), "w") as fout:
-        fout.write("Hello World\n")
-
-    # unmount the encrypted diretorys
-    subprocess.check_call(["sudo", "umount", front_directory])
+def generate_encrypted_file(auth_token: 'AuthToken', cipher: str, key_bytes: str) -> bytes:
+    with EcryptfsMount(auth_token, cipher, int(key_bytes), filename_crypto=False) as mount:
+        return mount.write_file("TestFile", "Hello World\n")
 
-    # copy the encrypted file
-    with open(os.path.join(back_directory, "TestFile"), "rb") as fin:
-        data = fin.read()
 
-    # FIXME: Why is the file not overwritten when it's not unlinked?!
-    os.unlink(os.path.join(back_directory, "TestFile"))
+def encrypt_filenames_ecryptfs(filenames: Iterable[str], auth_token: 'AuthToken',
+                               cipher: str = "aes", key_bytes: int = 24) -> Dict[str, str]:
+    """Encrypt the given filenames using a single native ecryptfs mount"""
+    with EcryptfsMount(auth_token, cipher, key_bytes) as mount:
+        return mount.encrypt_filenames(filenames)
 
-    os.rmdir(back_directory)
-    os.rmdir(front_directory)
 
-    return data
+def decrypt_filenames_ecryptfs(enc_filenames: Iterable[str], auth_token: 'AuthToken',
+                               cipher: str = "aes", key_bytes: int = 24) -> Dict[str, str]:
+    """Decrypt the given filenames using a single native ecryptfs mount"""
+    with EcryptfsMount(auth_token, cipher, key_bytes, lower_files=enc_filenames) as mount:
+        return mount.decrypt_filenames()
 
 
 def encrypt_filename_ecryptfs(filename: str, auth_token: 'AuthToken', cipher: str = "aes", key_bytes: int = 24) -> str:
     """Encrypt the given filename using native ecryptfs"""
-
     filename = os.fsdecode(filename)
-
-    back_directory = tempfile.mkdtemp("_pecryptfs_back")
-    front_directory = tempfile.mkdtemp("_pecryptfs_front")
-
-    # mount the encrypted directory
-    cmd = ["sudo", "mount",
-           "-t", "ecryptfs",
-           "-o", ",".join(["key=passphrase:passwd={}".format(auth_token.password_text),
-                           "passphrase_salt={}".format(auth_token.salt_text),
-                           "ecryptfs_enable_filename_crypto=yes",
-                           "ecryptfs_passthrough=no",
-                           "ecryptfs_unlink_sigs",
-                           "ecryptfs_fnek_sig={}".format(auth_token.signature_text),
-                           "no_sig_cache",
-                           "ecryptfs_cipher={}".format(cipher),
-                           "ecryptfs_key_bytes={}".format(key_bytes)]),
-           back_directory,
-           front_directory]
-
-    with open(os.devnull, 'w') as devnull:
-        subprocess.check_call(cmd, stdout=devnull)
-
-    # write file and let it be encrypted
-    with open(os.path.join(front_directory, filename), "w") as fout:
-        fout.write("Hello World\n")
-
-    # unmount the encrypted diretorys
-    subprocess.check_call(["sudo", "umount", front_directory])
-
-    files = os.listdir(back_directory)
-    assert len(files) == 1
-    encrypted_filename = files[0]
-
-    os.unlink(os.path.join(back_directory, encrypted_filename))
-
-    os.rmdir(back_directory)
-    os.rmdir(front_directory)
-
-    return encrypted_filename
+    return encrypt_filenames_ecryptfs([filename], auth_token, cipher, key_bytes)[filename]
 
 
 def decrypt_filename_ecryptfs(enc_filename_bin: str, auth_token: 'AuthToken',
                               cipher: str = "aes", key_bytes: int = 24) -> str:
     """Decrypt the given filename using native ecryptfs"""
-
     enc_filename = os.fsdecode(enc_filename_bin)
-
-    back_directory = tempfile.mkdtemp("_pecryptfs_back")
-    front_directory = tempfile.mkdtemp("_pecryptfs_front")
-
-    # write file and let it be encrypted
-    with open(os.path.join(back_directory, enc_filename), "w") as fout:
-        fout.write("Hello World\n")
-
-    # mount the encrypted directory
-    cmd = ["sudo", "mount",
-           "-t", "ecryptfs",
-           "-o", ",".join(["key=passphrase:passwd={}".format(auth_token.password_text),
-                           "passphrase_salt={}".format(auth_token.salt_text),
-                           "ecryptfs_enable_filename_crypto=yes",
-                           "ecryptfs_passthrough=no",
-                           "ecryptfs_unlink_sigs",
-                           "ecryptfs_fnek_sig={}".format(auth_token.signature_text),
-                           "no_sig_cache",
-                           "ecryptfs_cipher={}".format(cipher),
-                           "ecryptfs_key_bytes={}".format(key_bytes)]),
-           back_directory,
-           front_directory]
-
-    with open(os.devnull, 'w') as devnull:
-        subprocess.check_call(cmd, stdout=devnull)
-
-    # retrieve the decrypted filename
-    files = os.listdir(front_directory)
-    assert len(files) == 1
-    filename = files[0]
-
-    # unmount the encrypted diretorys
-    subprocess.check_call(["sudo", "umount", front_directory])
-
-    os.unlink(os.path.join(back_directory, enc_filename))
-
-    os.rmdir(back_directory)
-    os.rmdir(front_directory)
-
-    return filename
+    return decrypt_filenames_ecryptfs([enc_filename], auth_token, cipher, key_bytes)[enc_filename]
 
 
 # EOF #
@@ -0,0 +1,105 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Dict, Hashable, Optional, Tuple
+
+import collections
+import threading
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# (file identity, extent number)
+ExtentKey = Tuple[Hashable, int]
+
+
+class ExtentCache:
+    """Decrypted extents shared between File instances, the least
+    recently used extents are dropped once the total size exceeds
+    max_bytes. Safe to use from multiple threads."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._extents: 'collections.OrderedDict[ExtentKey, bytes]' = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: ExtentKey) -> Optional[bytes]:
+        with self._lock:
+            data = self._extents.get(key)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._extents.move_to_end(key)
+            return data
+
+    def put(self, key: ExtentKey, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._extents.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+
+            self._extents[key] = data
+            self._size += len(data)
+
+            while self._size > self.max_bytes:
+                _, evicted = self._extents.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._extents.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Number of bytes currently cached"""
+        return self._size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "extents": len(self._extents), "bytes": self._size, "max_bytes": self.max_bytes}
+
+    def __len__(self) -> int:
+        return len(self._extents)
+
+
+_default_cache: Optional[ExtentCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> ExtentCache:
+    """A cache shared by everything in the process that asks for it"""
+    global _default_cache  # pylint: disable=global-statement
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ExtentCache()
+        return _default_cache
+
+
+# EOF #
@@ -15,134 +15,569 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from typing import Any, IO, Optional, Type
-from types import TracebackType
+from typing import Deque, Hashable, IO, Iterator, Optional, Tuple, Union, TYPE_CHECKING
+from concurrent.futures import Future, ThreadPoolExecutor
 
+import collections
 import hashlib
+import io
+import mmap
+import os
 import struct
-from Crypto.Cipher import AES, Blowfish, DES3
+import time
+from Crypto.Util.strxor import strxor
 
 from pecryptfs.auth_token import AuthToken
-from pecryptfs.define import MAGIC_ECRYPTFS_MARKER
+from pecryptfs.cipher import Cipher, canonical_name, get_cipher_tag, key_size, new_cipher
+from pecryptfs.define import (
+    ECRYPTFS_DEFAULT_EXTENT_SIZE,
+    ECRYPTFS_FILE_VERSION,
+    ECRYPTFS_FLAG_ENCRYPTED,
+    ECRYPTFS_MINIMUM_HEADER_EXTENT_SIZE,
+    ECRYPTFS_TAG_3_PACKET_TYPE,
+    ECRYPTFS_TAG_11_PACKET_TYPE,
+    MAGIC_ECRYPTFS_MARKER,
+    RFC2440_HASH_MD5,
+    RFC2440_S2K_COUNT_65536,
+    RFC2440_S2K_SALTED_ITERATED)
+from pecryptfs.extent_cache import ExtentCache
 from pecryptfs.filename import make_cipher_from_desc
+from pecryptfs.header import FileHeader
+from pecryptfs.stats import Stats, timer
 
+if TYPE_CHECKING:
+    from _typeshed import ReadableBuffer, WriteableBuffer
 
-Cipher = Any
 
+# number of extents handed to a worker thread at once
+EXTENT_BATCH_SIZE = 64
 
-def make_cipher_from_desc2(key: bytes, cipher: str, key_bytes: int, iv: bytes) -> Cipher:
-    if cipher == "aes" and key_bytes == 16:
-        return AES.new(key[0:16], AES.MODE_CBC, iv)
-    elif cipher == "aes" and key_bytes == 24:
-        return AES.new(key[0:24], AES.MODE_CBC, iv)
-    elif cipher == "aes" and key_bytes == 32:
-        return AES.new(key[0:32], AES.MODE_CBC, iv)
-    elif cipher == "blowfish":
-        return Blowfish.new(key[0:key_bytes], Blowfish.MODE_CBC, iv[:8])
-    elif cipher == "des3":
-        return DES3.new(key[0:24], DES3.MODE_CBC, iv)
-    else:
-        # RFC2440_CIPHER_CAST_5 = 0x03
-        # RFC2440_CIPHER_TWOFISH = 0x0a
-        # RFC2440_CIPHER_CAST_6 = 0x0b
-        # RFC2440_CIPHER_RSA = 0x01
-        raise ValueError("unknown cipher: {}:{}".format(cipher, key_bytes))
 
+def make_cipher_from_desc2(key: bytes, cipher: str, key_bytes: int, iv: Optional[bytes] = None) -> Cipher:
+    """Create a CBC cipher for the given iv, or an ECB one when None,
+    with the backend that is fastest for whole extents"""
+    return new_cipher(cipher, key[0:key_size(cipher, key_bytes)], iv, bulk=True)
+
+
+def derive_extent_iv(root_iv: bytes, extent: int) -> bytes:
+    """Calculate the IV of the given extent, the extent number is
+    appended as decimal string, see ecryptfs/crypto.c:ecryptfs_derive_iv()"""
+    src = root_iv + b"%d" % extent
+    src += b"\x00" * (len(root_iv) + 16 - len(src))
+    return hashlib.md5(src).digest()
+
+
+class ExtentCipher:
+    """CBC decryption of extents with a key schedule that is only
+    computed once per file. PyCryptodome doesn't allow changing the IV of
+    a CBC cipher object, so the extents are decrypted in ECB mode and the
+    chaining is done by hand. Instances hold no per-call state and can
+    be shared between threads."""
+
+    def __init__(self, key: bytes, cipher: str, key_bytes: int, root_iv: bytes,
+                 stats: Optional[Stats] = None) -> None:
+        self.key = key
+        self.cipher = cipher
+        self.key_bytes = key_bytes
+        self.stats = stats
+
+        self._ecb = make_cipher_from_desc2(key, cipher, key_bytes)
+        self.block_size: int = self._ecb.block_size
+
+        # hash state after root_iv, so that only the extent number
+        # needs to be hashed for every extent
+        self._root_md5 = hashlib.md5(root_iv)
+        self._iv_padding = b"\x00" * 16
+
+    def derive_iv(self, extent: int) -> bytes:
+        """Same as derive_extent_iv()"""
+        number = b"%d" % extent
+        md5 = self._root_md5.copy()
+        md5.update(number)
+        md5.update(self._iv_padding[len(number):])
+        return md5.digest()[0:self.block_size]
+
+    def encrypt(self, extent: int, data: Union[bytes, bytearray]) -> bytes:
+        """Encrypt a single extent, CBC encryption can't be split up into
+        independent blocks, so this needs a new cipher object per extent"""
+        encryptor = make_cipher_from_desc2(self.key, self.cipher, self.key_bytes, self.derive_iv(extent))
+        result: bytes = encryptor.encrypt(data)
+        return result
+
+    def decrypt(self, extent: int, data: bytes) -> bytes:
+        """Decrypt a single extent"""
+        return self.decrypt_run(extent, data, len(data))
+
+    def decrypt_into(self, extent: int, data: Union[bytes, memoryview], output: Union[bytearray, memoryview]) -> None:
+        """Decrypt a single extent into output, which must be of the
+        same size as data"""
+        self.decrypt_run_into(extent, data, memoryview(output), len(data))
+
+    def _run_chain(self, extent: int, data: Union[bytes, memoryview], extent_size: int) -> bytes:
+        """The CBC chaining values of a run of extents: the ciphertext
+        shifted by one block with the IV of each extent spliced in"""
+        # CBC: P[i] = D(C[i]) ^ C[i - 1] with C[-1] = IV
+        start = time.perf_counter_ns() if self.stats is not None else 0
+        bs = self.block_size
+        chain = b"".join([self.derive_iv(extent + i) + data[offset:offset + extent_size - bs]
+                          for i, offset in enumerate(range(0, len(data), extent_size))])
+        if self.stats is not None:
+            self.stats.add("iv", 0, time.perf_counter_ns() - start, calls=-(-len(data) // extent_size))
+        return chain
+
+    def decrypt_run(self, extent: int, data: Union[bytes, memoryview],
+                    extent_size: int = ECRYPTFS_DEFAULT_EXTENT_SIZE) -> bytes:
+        """Decrypt the consecutive extents in data, starting at extent,
+        with a single ECB and a single XOR call for the whole run"""
+        chain = self._run_chain(extent, data, extent_size)
+        start = time.perf_counter_ns() if self.stats is not None else 0
+        result: bytes = strxor(self._ecb.decrypt(data), chain)
+        if self.stats is not None:
+            self.stats.add("decrypt", len(data), time.perf_counter_ns() - start)
+        return result
 
-class File:
+    def decrypt_run_into(self, extent: int, data: Union[bytes, memoryview], output: memoryview,
+                         extent_size: int = ECRYPTFS_DEFAULT_EXTENT_SIZE) -> None:
+        """Same as decrypt_run(), but writes to output"""
+        chain = self._run_chain(extent, data, extent_size)
+        start = time.perf_counter_ns() if self.stats is not None else 0
+        self._ecb.decrypt(data, output=output)
+        strxor(output, chain, output=output)
+        if self.stats is not None:
+            self.stats.add("decrypt", len(data), time.perf_counter_ns() - start)
+
+
+class File(io.RawIOBase):
+    """Seekable read-only view on the plaintext of an eCryptfs file,
+    only the extents overlapping a read are decrypted"""
 
     @staticmethod
-    def from_file(filename: str, auth_token: AuthToken, cipher: str, key_bytes: int) -> 'File':
-        fin = open(filename, "rb")  # pylint: disable=consider-using-with
-        efs = File(fin, auth_token, cipher, key_bytes)
+    def from_file(filename: str, auth_token: AuthToken, cipher: Optional[str] = None, key_bytes: Optional[int] = None,
+                  workers: int = 1, use_mmap: bool = False, cache: Optional[ExtentCache] = None,
+                  stats: Optional[Stats] = None) -> 'File':
+        fin = open(filename, "rb", buffering=0 if use_mmap else -1)  # pylint: disable=consider-using-with
+        try:
+            efs = File(fin, auth_token, cipher, key_bytes, workers=workers, use_mmap=use_mmap, cache=cache,
+                       stats=stats)
+        except BaseException:
+            fin.close()
+            raise
         return efs
 
-    def __init__(self, fin: IO[bytes], auth_token: AuthToken, cipher: str, key_bytes: int) -> None:
+    def __init__(self, fin: IO[bytes], auth_token: AuthToken, cipher: Optional[str] = None,
+                 key_bytes: Optional[int] = None, workers: int = 1, use_mmap: bool = False,
+                 cache: Optional[ExtentCache] = None, stats: Optional[Stats] = None) -> None:
+        super().__init__()
+
         self.fin = fin
         self.auth_token = auth_token
-        self.cipher = cipher
-        self.key_bytes = key_bytes
+        self.stats = stats
 
-        # see ecryptfs_write_headers_virt
+        # number of threads used by iter_extents() and readall()
+        self.workers = workers
 
-        header = fin.read(8192)
-        self.file_size = struct.unpack(">q", header[0:8])[0]
-        self.marker1, self.marker2 = struct.unpack(">II", header[8:16])
-        self.version = header[16]
-        self.reserved = header[17:19]
-        self.flags = header[19]
+        with timer(stats, "header", 8192):
+            header = fin.read(8192)
+            self.header = FileHeader(header)
 
-        self.header_extent_size = struct.unpack(">i", header[20:24])[0]
-        self.header_extent_count = struct.unpack(">h", header[24:26])[0]
+        self.file_size = self.header.file_size
+        self.marker1, self.marker2 = self.header.marker1, self.header.marker2
+        self.version = self.header.version
+        self.reserved = self.header.reserved
+        self.flags = self.header.flags
+
+        self.header_extent_size = self.header.header_extent_size
+        self.header_extent_count = self.header.header_extent_count
         assert self.header_extent_size == 4096
         assert self.header_extent_count == 2
 
-        self.rfc2440 = header[24:8192]
+        self.data_offset = self.header.data_offset
 
-        # rfc2440 Tag3/Tag11
-        self.salt = header[32:32 + 8]
-        self.hash_iterations = header[32 + 8]
-        self.encrypted_key = header[41:41 + self.key_bytes]
-        # b'\xed\x16b\x08_CONSOLE\x00' follows
+        self.rfc2440 = header[24:8192]
 
-        # print("16:", header[41+16:41+16+13])
-        # print("32:", header[41+32:41+32+13])
-        # print("56:", header[41+56:41+56+13])
+        # the cipher and key size are taken from the Tag 3 packet, when
+        # given they only serve as a check
+        self.cipher = canonical_name(self.header.cipher)
+        self.key_bytes = self.header.key_bytes
+        if ((cipher is not None and canonical_name(cipher) != self.cipher) or
+                (key_bytes is not None and key_size(self.cipher, key_bytes) != self.key_bytes)):
+            raise RuntimeError("file is encrypted with {}:{}, not {}:{}".format(
+                self.cipher, self.key_bytes, cipher, key_bytes))
 
-        # check that the file is a proper eCryptfs file
-        if self.marker1 != self.marker2 ^ MAGIC_ECRYPTFS_MARKER:
-            raise RuntimeError("marker missmatch, not a eCryptfs encrypted file")
+        self.salt = self.header.salt
+        self.hash_iterations = self.header.hash_iterations
+        self.encrypted_key = self.header.encrypted_key
 
         if self.salt != self.auth_token.salt_bin:
             raise RuntimeError("salt of file and auth_token missmatch")
 
         # calculate keys
         # cipher = AES.new(self.auth_token.session_key[0:key_bytes], AES.MODE_ECB)
-        cipher_proc: Cipher = make_cipher_from_desc(self.auth_token, cipher, key_bytes)
-
-        self.key = cipher_proc.decrypt(self.encrypted_key)
-        # print("\nLEN:", len(self.key))
-        self.root_iv = hashlib.md5(self.key).digest()
+        with timer(stats, "fek_unwrap", len(self.encrypted_key)):
+            cipher_proc: Cipher = make_cipher_from_desc(self.auth_token, self.cipher, self.key_bytes)
+
+            # AES-192 keys are padded to 32 bytes before wrapping
+            self.key = cipher_proc.decrypt(self.encrypted_key)[0:self.key_bytes]
+            # print("\nLEN:", len(self.key))
+            self.root_iv = hashlib.md5(self.key).digest()
+
+        with timer(stats, "cipher_setup"):
+            self.extent_cipher = ExtentCipher(self.key, self.cipher, self.key_bytes, self.root_iv, stats=stats)
+
+        self._pos = 0
+        self._last_extent: Optional[Tuple[int, bytes]] = None
+
+        # with use_mmap the ciphertext is read straight from the page
+        # cache and whole extents are decrypted into the buffer given to
+        # readinto(), fin must be a real file for this
+        self._map: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        if use_mmap:
+            self._map = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+
+        # decrypted extents shared with other File instances, the key
+        # is part of the identity so a wrong password never gets to
+        # see the plaintext cached by a right one
+        self.cache = cache
+        self.cache_id: Hashable = (id(fin), self.root_iv)
+        if cache is not None:
+            try:
+                st = os.fstat(fin.fileno())
+                self.cache_id = (st.st_dev, st.st_ino, st.st_mtime_ns, self.root_iv)
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                pass
 
     def close(self) -> None:
-        self.fin.close()
-
-    def read(self) -> bytes:
-        page = 0
-        byte_count = 0
-        result = b""
-
+        if not self.closed:
+            if self._map is not None:
+                assert self._view is not None
+                self._view.release()
+                self._map.close()
+            self.fin.close()
+        super().close()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.file_size + offset
+        else:
+            raise ValueError("invalid whence ({}, should be 0, 1 or 2)".format(whence))
+
+        if pos < 0:
+            raise ValueError("negative seek position {}".format(pos))
+
+        self._pos = pos
+        return self._pos
+
+    def _decrypt_extent(self, extent: int, data: bytes) -> bytes:
+        output = self.extent_cipher.decrypt(extent, data)
+
+        remaining = max(0, self.file_size - extent * self.header_extent_size)
+        if remaining < len(output):
+            output = output[0:remaining]
+
+        return output
+
+    def _read_extent(self, extent: int, count: int = 1) -> bytes:
+        """Decrypt a single extent, with a cache the following count - 1
+        extents are decrypted in the same cipher call and cached too"""
+        if self._last_extent is not None and self._last_extent[0] == extent:
+            return self._last_extent[1]
+
+        if self.cache is not None:
+            cached = self.cache.get((self.cache_id, extent))
+            if cached is not None:
+                output = cached
+            else:
+                data = self._read_at(self.data_offset + extent * self.header_extent_size,
+                                     count * self.header_extent_size)
+                outputs = self._decrypt_run(extent, data) if data else [b""]
+                for i, extent_output in enumerate(outputs):
+                    self.cache.put((self.cache_id, extent + i), extent_output)
+                output = outputs[0]
+        else:
+            data = self._read_at(self.data_offset + extent * self.header_extent_size, self.header_extent_size)
+            output = self._decrypt_extent(extent, data)
+
+        self._last_extent = (extent, output)
+        return output
+
+    def _read_at(self, offset: int, size: int) -> bytes:
+        if self.stats is not None:
+            start = time.perf_counter_ns()
+            data = self._read_at_uncounted(offset, size)
+            self.stats.add("read", len(data), time.perf_counter_ns() - start)
+            return data
+
+        return self._read_at_uncounted(offset, size)
+
+    def _read_at_uncounted(self, offset: int, size: int) -> bytes:
+        if self._map is not None:
+            return self._map[offset:offset + size]
+
+        self.fin.seek(offset)
+        return self.fin.read(size)
+
+    def _decrypt_run(self, extent: int, data: bytes) -> list[bytes]:
+        """Decrypt a run of consecutive extents starting at extent"""
+        size = self.header_extent_size
+        output = self.extent_cipher.decrypt_run(extent, data, size)
+
+        remaining = max(0, self.file_size - extent * size)
+        return [output[offset:min(offset + size, remaining)]
+                for offset in range(0, len(output), size)]
+
+    def iter_extents(self) -> Iterator[bytes]:
+        """Decrypt the file from the current position to the end one
+        extent at a time, only a small number of extents is held in
+        memory, so this is suitable for arbitrarily large files"""
+        extent, extent_offset = divmod(self._pos, self.header_extent_size)
+
+        if self.workers > 1:
+            runs = self._iter_runs_parallel(extent)
+        else:
+            runs = self._iter_runs(extent)
+
+        for run in runs:
+            for output in run:
+                if self._pos >= self.file_size:
+                    return
+
+                if extent_offset:
+                    output = output[extent_offset:]
+                    extent_offset = 0
+                self._pos += len(output)
+
+                yield output
+
+    def _iter_runs(self, extent: int) -> Iterator[list[bytes]]:
+        run_size = EXTENT_BATCH_SIZE * self.header_extent_size
         while True:
-            data = self.fin.read(4096)
+            data = self._read_at(self.data_offset + extent * self.header_extent_size, run_size)
             if data == b"":
                 break
-            byte_count += len(data)
 
-            if byte_count > self.file_size:
-                actual_block_size = 4096 - (byte_count - self.file_size)
-            else:
-                actual_block_size = 4096
+            yield self._decrypt_run(extent, data)
+            extent += len(data) // self.header_extent_size
+
+    def _iter_runs_parallel(self, extent: int) -> Iterator[list[bytes]]:
+        """Hand batches of extents to a thread pool, the cipher code
+        releases the GIL, and return the results in order. The number of
+        batches in flight is bounded to keep memory use constant."""
+        run_size = EXTENT_BATCH_SIZE * self.header_extent_size
+        pending: Deque['Future[list[bytes]]'] = collections.deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                while len(pending) < 2 * self.workers:
+                    data = self._read_at(self.data_offset + extent * self.header_extent_size, run_size)
+                    if data == b"":
+                        break
+
+                    pending.append(executor.submit(self._decrypt_run, extent, data))
+                    extent += len(data) // self.header_extent_size
+
+                if not pending:
+                    break
+
+                yield pending.popleft().result()
+
+    def readinto(self, buf: "WriteableBuffer") -> int:
+        """Decrypt the next len(buf) bytes into buf, returns the number
+        of bytes written, zero at the end of the file"""
+        view = memoryview(buf).cast("B")
+        count = 0
+
+        while count < len(view) and self._pos < self.file_size:
+            extent, extent_offset = divmod(self._pos, self.header_extent_size)
+            # large reads decrypt whole extents straight into buf, unless
+            # they can be served from the cache
+            if self.cache is None and extent_offset == 0 and (self._view is not None or
+                                                              len(view) - count >= 2 * self.header_extent_size):
+                written = self._decrypt_extents_into(extent, view[count:])
+                if written:
+                    self._pos += written
+                    count += written
+                    continue
+
+            needed = -(-(extent_offset + len(view) - count) // self.header_extent_size)
+            output = self._read_extent(extent, min(needed, EXTENT_BATCH_SIZE))
+            if len(output) <= extent_offset:
+                break
 
-            derived_iv = hashlib.md5(self.root_iv + struct.pack("<Q", 0x30 + page) + b"\x00" * 8).digest()
+            chunk = memoryview(output)[extent_offset:extent_offset + len(view) - count]
+            view[count:count + len(chunk)] = chunk
+            self._pos += len(chunk)
+            count += len(chunk)
+
+        return count
+
+    def _decrypt_extents_into(self, extent: int, view: memoryview) -> int:
+        """Decrypt the whole extents starting at extent that fit into view
+        with a single cipher call, returns the number of bytes written"""
+        size = self.header_extent_size
+        offset = self.data_offset + extent * size
+
+        count: int = min(len(view), self.file_size - extent * size) // size
+        count = min(count, EXTENT_BATCH_SIZE)
+        if count <= 0:
+            return 0
+
+        # with mmap the ciphertext is passed to the cipher without a copy
+        data: Union[bytes, memoryview]
+        if self._view is not None:
+            data = self._view[offset:offset + count * size]
+        else:
+            data = self._read_at(offset, count * size)
+
+        count = len(data) // size
+        if count == 0:
+            return 0
+
+        self.extent_cipher.decrypt_run_into(extent, data[:count * size], view[:count * size], size)
+        return count * size
+
+    def readall(self) -> bytes:
+        return b"".join(self.iter_extents())
+
+
+def write_packet_length(length: int) -> bytes:
+    """See ecryptfs/keystore.c:ecryptfs_write_packet_length()"""
+    if length < 192:
+        return bytes([length])
+    elif length < 8384:
+        length -= 192
+        return bytes([(length >> 8) + 192, length & 0xff])
+    else:
+        raise ValueError("packet length too large: {}".format(length))
 
-            # decryptor = AES.new(self.key, AES.MODE_CBC, IV=derived_iv)
-            decryptor = make_cipher_from_desc2(self.key, self.cipher, self.key_bytes, derived_iv)
-            output = decryptor.decrypt(data)
 
-            result += output[0:actual_block_size]
-            page += 1
+def build_header(file_size: int, marker: int, cipher_tag: int, salt: bytes,
+                 encrypted_key: bytes, signature: bytes) -> bytes:
+    """Build the metadata header that File parses, see
+    ecryptfs/crypto.c:ecryptfs_write_headers_virt()"""
+    header = bytearray(ECRYPTFS_MINIMUM_HEADER_EXTENT_SIZE)
 
-        return result
+    struct.pack_into(">qII", header, 0, file_size, marker, marker ^ MAGIC_ECRYPTFS_MARKER)
+    struct.pack_into(">Iih", header, 16,
+                     (ECRYPTFS_FILE_VERSION << 24) | ECRYPTFS_FLAG_ENCRYPTED,
+                     ECRYPTFS_DEFAULT_EXTENT_SIZE,
+                     ECRYPTFS_MINIMUM_HEADER_EXTENT_SIZE // ECRYPTFS_DEFAULT_EXTENT_SIZE)
+
+    # Tag 3: password encrypted FEK, see write_tag_3_packet()
+    tag3_body = (bytes([0x04, cipher_tag, RFC2440_S2K_SALTED_ITERATED, RFC2440_HASH_MD5]) +
+                 salt + bytes([RFC2440_S2K_COUNT_65536]) + encrypted_key)
+
+    # Tag 11: literal data packet holding the key signature, see write_tag_11_packet()
+    tag11_body = b"\x62\x08_CONSOLE\x00\x00\x00\x00" + signature
+
+    packets = (bytes([ECRYPTFS_TAG_3_PACKET_TYPE]) + write_packet_length(len(tag3_body)) + tag3_body +
+               bytes([ECRYPTFS_TAG_11_PACKET_TYPE]) + write_packet_length(len(tag11_body)) + tag11_body)
+    header[26:26 + len(packets)] = packets
+
+    return bytes(header)
+
+
+class FileWriter(io.RawIOBase):
+    """Write-only stream that produces an eCryptfs encrypted file, the
+    counterpart of File. Data is encrypted extent by extent as it is
+    written, the file size in the header is filled in on close(), which
+    requires a seekable output unless file_size is known in advance."""
+
+    @staticmethod
+    def from_file(filename: str, auth_token: AuthToken, cipher: str, key_bytes: int) -> 'FileWriter':
+        fout = open(filename, "wb")  # pylint: disable=consider-using-with
+        return FileWriter(fout, auth_token, cipher, key_bytes)
+
+    def __init__(self, fout: IO[bytes], auth_token: AuthToken, cipher: str, key_bytes: int,
+                 file_size: Optional[int] = None, fek: Optional[bytes] = None, marker: Optional[int] = None,
+                 closefd: bool = True) -> None:
+        super().__init__()
+
+        self.fout = fout
+        self.closefd = closefd
+        self.auth_token = auth_token
+        self.cipher = cipher
+        self.key_bytes = key_bytes
+        self.file_size = file_size
+
+        # the FEK is random, the kernel pads AES-192 keys to 32 bytes
+        # before wrapping them, see write_tag_3_packet()
+        self.key = fek if fek is not None else os.urandom(key_bytes)
+        wrapped_key = self.key
+        if cipher == "aes" and key_bytes == 24:
+            wrapped_key += b"\x00" * 8
+
+        cipher_proc: Cipher = make_cipher_from_desc(auth_token, cipher, key_bytes)
+        encrypted_key = cipher_proc.encrypt(wrapped_key)
+
+        self.root_iv = hashlib.md5(self.key).digest()
+        self.extent_cipher = ExtentCipher(self.key, cipher, key_bytes, self.root_iv)
+
+        if marker is None:
+            marker = struct.unpack(">I", os.urandom(4))[0]
+
+        self.fout.write(build_header(file_size or 0, marker, get_cipher_tag(cipher, key_bytes),
+                                     auth_token.salt_bin, encrypted_key,
+                                     bytes.fromhex(auth_token.signature_text)))
 
-    def __enter__(self) -> 'File':
-        return self
+        self._extent = 0
+        self._written = 0
+        self._pending = bytearray()
 
-    def __exit__(self,  # pylint: disable=useless-return
-                 exc_type: Optional[Type[BaseException]],
-                 exc_value: Optional[BaseException],
-                 traceback: Optional[TracebackType]) -> Optional[bool]:
-        self.close()
-        return None
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: "ReadableBuffer") -> int:
+        view = memoryview(data).cast("B")
+        self._pending += view
+        self._written += len(view)
+
+        extent_size = ECRYPTFS_DEFAULT_EXTENT_SIZE
+        complete = len(self._pending) // extent_size * extent_size
+        for offset in range(0, complete, extent_size):
+            self.fout.write(self.extent_cipher.encrypt(self._extent, self._pending[offset:offset + extent_size]))
+            self._extent += 1
+        del self._pending[0:complete]
+
+        return len(view)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        try:
+            if self._pending:
+                # the last extent is zero padded
+                self._pending += b"\x00" * (ECRYPTFS_DEFAULT_EXTENT_SIZE - len(self._pending))
+                self.fout.write(self.extent_cipher.encrypt(self._extent, self._pending))
+                self._pending.clear()
+
+            if self.file_size is None:
+                self.fout.seek(0)
+                self.fout.write(struct.pack(">q", self._written))
+            elif self.file_size != self._written:
+                raise RuntimeError("file size mismatch, announced {} bytes, got {}".format(
+                    self.file_size, self._written))
+        finally:
+            if self.closefd:
+                self.fout.close()
+            else:
+                self.fout.flush()
+            super().close()
 
 
 # EOF #
@@ -15,25 +15,20 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from typing import Any
+from typing import Dict, Iterable, Iterator, Optional
 
+import binascii
 import os
 import hashlib
-from Crypto.Cipher import AES, Blowfish, DES3
+import time
 
 from pecryptfs.auth_token import AuthToken
+from pecryptfs.cipher import Cipher, cipher_from_tag, get_cipher_tag, key_size, new_cipher
 from pecryptfs.define import (
     ECRYPTFS_TAG_70_PACKET_TYPE,
     ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX,
-    ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX_SIZE,
-    RFC2440_CIPHER_AES_128,
-    RFC2440_CIPHER_AES_192,
-    RFC2440_CIPHER_AES_256,
-    RFC2440_CIPHER_BLOWFISH,
-    RFC2440_CIPHER_DES3_EDE)
-
-
-Cipher = Any
+    ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX_SIZE)
+from pecryptfs.stats import Stats, timer
 
 
 PORTABLE_FILENAME_CHARS = b"-.0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
@@ -48,99 +43,22 @@ def build_filename_rev_map() -> bytes:
 
 FILENAME_REV_MAP = build_filename_rev_map()
 
+BASE64_CHARS = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
 
-def make_cipher(auth_token: AuthToken, tag: int, key_bytes: int) -> Cipher:
-    if tag == RFC2440_CIPHER_AES_128:
-        return AES.new(auth_token.session_key[0:16], AES.MODE_ECB)
-    elif tag == RFC2440_CIPHER_AES_192:
-        return AES.new(auth_token.session_key[0:24], AES.MODE_ECB)
-    elif tag == RFC2440_CIPHER_AES_256:
-        return AES.new(auth_token.session_key[0:32], AES.MODE_ECB)
-    elif tag == RFC2440_CIPHER_BLOWFISH:
-        return Blowfish.new(auth_token.session_key[0:key_bytes], Blowfish.MODE_ECB)
-    elif tag == RFC2440_CIPHER_DES3_EDE:
-        return DES3.new(auth_token.session_key[0:24], DES3.MODE_ECB)
-    else:
-        # RFC2440_CIPHER_CAST_5 = 0x03
-        # RFC2440_CIPHER_TWOFISH = 0x0a
-        # RFC2440_CIPHER_CAST_6 = 0x0b
-        # RFC2440_CIPHER_RSA = 0x01
-        raise ValueError("unknown cipher tag: {}".format(tag))
-
-
-def make_cipher_from_desc(auth_token: AuthToken, cipher: str, key_bytes: int) -> Cipher:
-    if cipher == "aes" and key_bytes == 16:
-        return AES.new(auth_token.session_key[0:16], AES.MODE_ECB)
-    elif cipher == "aes" and key_bytes == 24:
-        return AES.new(auth_token.session_key[0:24], AES.MODE_ECB)
-    elif cipher == "aes" and key_bytes == 32:
-        return AES.new(auth_token.session_key[0:32], AES.MODE_ECB)
-    elif cipher == "blowfish":
-        return Blowfish.new(auth_token.session_key[0:key_bytes], Blowfish.MODE_ECB)
-    elif cipher == "des3":
-        return DES3.new(auth_token.session_key[0:24], DES3.MODE_ECB)
-    else:
-        # RFC2440_CIPHER_CAST_5 = 0x03
-        # RFC2440_CIPHER_TWOFISH = 0x0a
-        # RFC2440_CIPHER_CAST_6 = 0x0b
-        # RFC2440_CIPHER_RSA = 0x01
-        raise ValueError("unknown cipher: {}:{}".format(cipher, key_bytes))
-
-
-def get_cipher_tag(cipher: str, key_bytes: int) -> int:
-    if cipher == "des3":
-        return RFC2440_CIPHER_DES3_EDE
-    # elif cipher == "cast5":
-    #     return RFC2440_CIPHER_CAST_5
-    elif cipher == "blowfish":
-        return RFC2440_CIPHER_BLOWFISH
-    elif cipher == "aes" and key_bytes == 16:
-        return RFC2440_CIPHER_AES_128
-    elif cipher == "aes" and key_bytes == 24:
-        return RFC2440_CIPHER_AES_192
-    elif cipher == "aes" and key_bytes == 32:
-        return RFC2440_CIPHER_AES_256
-    # elif cipher == "twofish":
-    #     return RFC2440_CIPHER_TWOFISH
-    # elif cipher == "cast6":
-    #     RFC2440_CIPHER_CAST_6
-    else:
-        raise ValueError("unknown cipher '{}:{}'".format(cipher, key_bytes))
+BASE64_TO_PORTABLE = bytes.maketrans(BASE64_CHARS, PORTABLE_FILENAME_CHARS)
 
+# characters outside of PORTABLE_FILENAME_CHARS decode as zero, same as
+# with FILENAME_REV_MAP
+PORTABLE_TO_BASE64 = bytes(BASE64_CHARS[idx] for idx in FILENAME_REV_MAP)
 
-def decrypt_filename(enc_filename_bin: str, auth_token: AuthToken, cipher: str = "aes", key_bytes: int = 24) -> str:
-    enc_filename = os.fsdecode(enc_filename_bin)  # type: str
 
-    if not enc_filename.startswith(ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX):
-        # assume unencrypted filename
-        return enc_filename
-    else:
-        data = convert_6bit_to_8bit(enc_filename[ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX_SIZE:])
-
-        assert data[0] == ECRYPTFS_TAG_70_PACKET_TYPE
-        pkg_len = data[1]  # FIXME: this is really a variable length encoding
-        block_aligned_filename_size = pkg_len - 8 - 1
-
-        signature = data[2:10]
-        if signature.hex() != auth_token.signature_text:
-            raise ValueError("signature mismatch, key not suited for filename")
-
-        cipher_proc = make_cipher(auth_token, data[10], key_bytes)
-
-        text = data[11:11 + block_aligned_filename_size]
-        res = cipher_proc.decrypt(text)
-
-        try:
-            _, filename = res.rsplit(b'\0', 1)
-        except ValueError:
-            print()
-            print("error: failure to split: '{}'".format(res))
-            print("  input:", enc_filename)
-            raise
+def make_cipher(auth_token: AuthToken, tag: int, key_bytes: int) -> Cipher:
+    cipher, key_bytes = cipher_from_tag(tag, key_bytes)
+    return make_cipher_from_desc(auth_token, cipher, key_bytes)
 
-        result = filename.rstrip(b'\x00')
 
-        return os.fsdecode(result)
+def make_cipher_from_desc(auth_token: AuthToken, cipher: str, key_bytes: int) -> Cipher:
+    return new_cipher(cipher, auth_token.session_key[0:key_size(cipher, key_bytes)])
 
 
 def round_to_multiple_of(n: int, base: int) -> int:
@@ -187,32 +105,154 @@ def generate_filename_suffix(padded_filename: bytes) -> bytes:
         raise ValueError("filename to long")
 
 
-def encrypt_filename(filename: str, auth_token: AuthToken, cipher: str = "aes", key_bytes: int = 24) -> str:
-    filename_bin: bytes = os.fsencode(filename)
+class FilenameCodec:
+    """Filename encryption and decryption bound to a single AuthToken.
+    Cipher objects, the binary signature and the prefix padding are
+    computed once and reused, which matters when processing whole
+    directories."""
+
+    def __init__(self, auth_token: AuthToken, cipher: str = "aes", key_bytes: int = 24,
+                 stats: Optional[Stats] = None) -> None:
+        self.auth_token = auth_token
+        self.cipher = cipher
+        self.key_bytes = key_bytes
+        self.stats = stats
+
+        self._signature: Optional[bytes] = None
+        self._ciphers: Dict[int, Cipher] = {}
+        self._prefixes: Dict[int, bytes] = {}
+
+    @property
+    def signature(self) -> bytes:
+        # computed on first use, so that passing through unencrypted
+        # filenames doesn't require the session key
+        if self._signature is None:
+            self._signature = bytes.fromhex(self.auth_token.signature_text)
+        return self._signature
+
+    def _get_cipher(self, tag: int) -> Cipher:
+        cipher_proc = self._ciphers.get(tag)
+        if cipher_proc is None:
+            with timer(self.stats, "cipher_setup"):
+                cipher_proc = make_cipher(self.auth_token, tag, self.key_bytes)
+            self._ciphers[tag] = cipher_proc
+        return cipher_proc
+
+    def _get_prefix(self, filename: bytes) -> bytes:
+        prefix = self._prefixes.get(len(filename))
+        if prefix is None:
+            prefix = generate_filename_prefix(self.auth_token, filename)
+            self._prefixes[len(filename)] = prefix
+        return prefix
+
+    def decrypt(self, enc_filename_bin: str) -> str:
+        enc_filename = os.fsdecode(enc_filename_bin)  # type: str
 
-    cipher_proc = make_cipher_from_desc(auth_token, cipher, key_bytes)
+        if not enc_filename.startswith(ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX):
+            # assume unencrypted filename
+            return enc_filename
+        else:
+            start = time.perf_counter_ns() if self.stats is not None else 0
+            data = convert_6bit_to_8bit(enc_filename[ECRYPTFS_FNEK_ENCRYPTED_FILENAME_PREFIX_SIZE:])
+            if self.stats is not None:
+                self.stats.add("filename_codec", len(data), time.perf_counter_ns() - start)
 
-    prefix_padding = generate_filename_prefix(auth_token, filename_bin)
+            assert data[0] == ECRYPTFS_TAG_70_PACKET_TYPE
+            pkg_len = data[1]  # FIXME: this is really a variable length encoding
+            block_aligned_filename_size = pkg_len - 8 - 1
 
-    junked_filename = prefix_padding + b"\x00" + filename_bin
+            signature = data[2:10]
+            if signature != self.signature:
+                raise ValueError("signature mismatch, key not suited for filename")
 
-    padding_length = (((len(junked_filename) - 1) // 16) + 1) * 16 - len(junked_filename)
-    padded_filename = junked_filename + b'\x00' * padding_length
-    res = cipher_proc.encrypt(padded_filename)
+            cipher_proc = self._get_cipher(data[10])
 
-    payload = (bytes([ECRYPTFS_TAG_70_PACKET_TYPE, len(padded_filename) + 9]) +
-               bytes.fromhex(auth_token.signature_text) +
-               bytes([get_cipher_tag(cipher, key_bytes)]) +
-               res +
-               generate_filename_suffix(padded_filename))
+            text = data[11:11 + block_aligned_filename_size]
+            start = time.perf_counter_ns() if self.stats is not None else 0
+            res = cipher_proc.decrypt(text)
+            if self.stats is not None:
+                self.stats.add("filename_cipher", len(text), time.perf_counter_ns() - start)
 
-    result = "ECRYPTFS_FNEK_ENCRYPTED." + convert_8bit_to_6bit(payload)
+            try:
+                _, filename = res.rsplit(b'\0', 1)
+            except ValueError:
+                print()
+                print("error: failure to split: '{}'".format(res))
+                print("  input:", enc_filename)
+                raise
 
-    return result
+            result = filename.rstrip(b'\x00')
+
+            return os.fsdecode(result)
+
+    def encrypt(self, filename: str) -> str:
+        filename_bin: bytes = os.fsencode(filename)
+
+        tag = get_cipher_tag(self.cipher, self.key_bytes)
+        cipher_proc = self._get_cipher(tag)
+
+        prefix_padding = self._get_prefix(filename_bin)
+
+        junked_filename = prefix_padding + b"\x00" + filename_bin
+
+        padding_length = (((len(junked_filename) - 1) // 16) + 1) * 16 - len(junked_filename)
+        padded_filename = junked_filename + b'\x00' * padding_length
+        start = time.perf_counter_ns() if self.stats is not None else 0
+        res = cipher_proc.encrypt(padded_filename)
+        if self.stats is not None:
+            self.stats.add("filename_cipher", len(padded_filename), time.perf_counter_ns() - start)
+
+        payload = (bytes([ECRYPTFS_TAG_70_PACKET_TYPE, len(padded_filename) + 9]) +
+                   self.signature +
+                   bytes([tag]) +
+                   res +
+                   generate_filename_suffix(padded_filename))
+
+        start = time.perf_counter_ns() if self.stats is not None else 0
+        result = "ECRYPTFS_FNEK_ENCRYPTED." + convert_8bit_to_6bit(payload)
+        if self.stats is not None:
+            self.stats.add("filename_codec", len(payload), time.perf_counter_ns() - start)
+
+        return result
+
+    def decrypt_many(self, enc_filenames: Iterable[str]) -> Iterator[str]:
+        for enc_filename in enc_filenames:
+            yield self.decrypt(enc_filename)
+
+    def encrypt_many(self, filenames: Iterable[str]) -> Iterator[str]:
+        for filename in filenames:
+            yield self.encrypt(filename)
+
+
+def decrypt_filename(enc_filename_bin: str, auth_token: AuthToken, cipher: str = "aes", key_bytes: int = 24,
+                     stats: Optional[Stats] = None) -> str:
+    return FilenameCodec(auth_token, cipher, key_bytes, stats=stats).decrypt(enc_filename_bin)
+
+
+def encrypt_filename(filename: str, auth_token: AuthToken, cipher: str = "aes", key_bytes: int = 24,
+                     stats: Optional[Stats] = None) -> str:
+    return FilenameCodec(auth_token, cipher, key_bytes, stats=stats).encrypt(filename)
 
 
 def convert_6bit_to_8bit(data_6bit: str) -> bytes:
     """Convert a 6bit encoded string into a byte sequence"""
+    # The encoding is base64 with a different alphabet and without
+    # padding. Trailing characters that don't fill a complete byte still
+    # produce one, so pad with zero bits and keep one byte per
+    # leftover character.
+    full, rest = divmod(len(data_6bit), 4)
+    data = data_6bit.encode("latin-1").translate(PORTABLE_TO_BASE64) + b"A" * (-rest % 4)
+    return binascii.a2b_base64(data)[0:full * 3 + rest]
+
+
+def convert_8bit_to_6bit(data_8bit: bytes) -> str:
+    """Convert a byte sequence into a 6bit encoded string"""
+    data = binascii.b2a_base64(data_8bit, newline=False).rstrip(b"=")
+    return data.translate(BASE64_TO_PORTABLE).decode("ascii")
+
+
+def convert_6bit_to_8bit_reference(data_6bit: str) -> bytes:
+    """Bit by bit version of convert_6bit_to_8bit()"""
     result = []
     bit_offset = 0
     for c in data_6bit:
@@ -239,8 +279,8 @@ def convert_6bit_to_8bit(data_6bit: str) -> bytes:
     return bytes(result)
 
 
-def convert_8bit_to_6bit(data_8bit: bytes) -> str:
-    """Convert a byte sequence into a 6bit encoded string"""
+def convert_8bit_to_6bit_reference(data_8bit: bytes) -> str:
+    """Bit by bit version of convert_8bit_to_6bit()"""
     result = bytearray()
     bit_offset = 0
     for c in data_8bit:
@@ -0,0 +1,175 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Dict, Optional, Type
+from types import TracebackType
+
+import os
+import sqlite3
+
+from pecryptfs.filename import FilenameCodec
+
+
+# bump when the tables change, older databases are dropped and rebuilt
+SCHEMA_VERSION = 1
+
+# path and names are stored as os.fsencode() bytes, as they aren't
+# necessarily valid UTF-8
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    id INTEGER PRIMARY KEY,
+    path BLOB NOT NULL,
+    signature TEXT NOT NULL,
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    UNIQUE (path, signature)
+);
+CREATE TABLE IF NOT EXISTS names (
+    directory INTEGER NOT NULL REFERENCES directories(id) ON DELETE CASCADE,
+    enc_name BLOB NOT NULL,
+    name BLOB NOT NULL,
+    PRIMARY KEY (directory, enc_name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS names_by_name ON names (directory, name);
+"""
+
+
+class SqliteFilenameIndex:
+    """Persistent mapping between encrypted and plaintext names, one
+    set of rows per (directory, key signature). A directory is only
+    decrypted again when its inode or mtime changed.
+
+    The database holds plaintext filenames, so it is created 0600 and
+    should be kept as private as the tree itself."""
+
+    def __init__(self, path: str, codec: FilenameCodec) -> None:
+        self.path = path
+        self.codec = codec
+        self.signature = codec.signature.hex()
+
+        if path != ":memory:" and not os.path.exists(path):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self.db:
+                self.db.execute("DROP TABLE IF EXISTS names")
+                self.db.execute("DROP TABLE IF EXISTS directories")
+                self.db.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+        self.db.executescript(SCHEMA)
+
+    @staticmethod
+    def default_path() -> str:
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(cache_home, "pecryptfs", "filenames.sqlite")
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> 'SqliteFilenameIndex':
+        return self
+
+    def __exit__(self,
+                 exc_type: Optional[Type[BaseException]],
+                 exc_value: Optional[BaseException],
+                 traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    def _decrypt(self, enc_names: list[str]) -> Dict[str, str]:
+        try:
+            return dict(zip(enc_names, self.codec.decrypt_many(enc_names)))
+        except (ValueError, AssertionError):
+            pass
+
+        # names of another key or garbage, skip just those
+        result = {}
+        for enc_name in enc_names:
+            try:
+                result[enc_name] = self.codec.decrypt(enc_name)
+            except (ValueError, AssertionError):
+                pass
+        return result
+
+    def update(self, directory: str) -> int:
+        """Index directory unless it is unchanged since the last call,
+        returns the id of its rows"""
+        path = os.path.realpath(directory)
+        st = os.stat(path)
+
+        row = self.db.execute("SELECT id, dev, ino, mtime_ns FROM directories WHERE path = ? AND signature = ?",
+                              (os.fsencode(path), self.signature)).fetchone()
+        if row is not None and tuple(row[1:]) == (st.st_dev, st.st_ino, st.st_mtime_ns):
+            directory_id: int = row[0]
+            return directory_id
+
+        names = self._decrypt(os.listdir(path))
+
+        with self.db:
+            if row is not None:
+                self.db.execute("DELETE FROM directories WHERE id = ?", (row[0],))
+            cursor = self.db.execute("INSERT INTO directories (path, signature, dev, ino, mtime_ns) "
+                                     "VALUES (?, ?, ?, ?, ?)",
+                                     (os.fsencode(path), self.signature, st.st_dev, st.st_ino, st.st_mtime_ns))
+            assert cursor.lastrowid is not None
+            directory_id = cursor.lastrowid
+            self.db.executemany("INSERT INTO names (directory, enc_name, name) VALUES (?, ?, ?)",
+                                ((directory_id, os.fsencode(enc_name), os.fsencode(name))
+                                 for enc_name, name in names.items()))
+
+        return directory_id
+
+    def listdir(self, directory: str) -> Dict[str, str]:
+        """Returns a mapping of the encrypted names in directory to their
+        plaintext, names that can't be decrypted are left out"""
+        directory_id = self.update(directory)
+        return {os.fsdecode(enc_name): os.fsdecode(name)
+                for enc_name, name in self.db.execute("SELECT enc_name, name FROM names WHERE directory = ?",
+                                                      (directory_id,))}
+
+    def decrypt(self, directory: str, enc_name: str) -> Optional[str]:
+        directory_id = self.update(directory)
+        row = self.db.execute("SELECT name FROM names WHERE directory = ? AND enc_name = ?",
+                              (directory_id, os.fsencode(enc_name))).fetchone()
+        return None if row is None else os.fsdecode(row[0])
+
+    def encrypt(self, directory: str, name: str) -> Optional[str]:
+        """Returns the encrypted name of name in directory, None if there
+        is no such entry"""
+        directory_id = self.update(directory)
+        row = self.db.execute("SELECT enc_name FROM names WHERE directory = ? AND name = ?",
+                              (directory_id, os.fsencode(name))).fetchone()
+        return None if row is None else os.fsdecode(row[0])
+
+    def lookup(self, root: str, path: str) -> Optional[str]:
+        """Returns the encrypted path of the plaintext path below root,
+        None if any component doesn't exist"""
+        result = root
+        for part in path.split("/"):
+            if not part:
+                continue
+
+            enc_name = self.encrypt(result, part)
+            if enc_name is None:
+                return None
+            result = os.path.join(result, enc_name)
+        return result
+
+
+# EOF #
@@ -0,0 +1,169 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Any, Dict, IO, Tuple
+
+import os
+import struct
+
+from pecryptfs.define import (
+    ECRYPTFS_TAG_3_PACKET_TYPE,
+    ECRYPTFS_TAG_11_PACKET_TYPE,
+    MAGIC_ECRYPTFS_MARKER,
+    RFC2440_CIPHER_AES_128,
+    RFC2440_CIPHER_AES_192,
+    RFC2440_CIPHER_AES_256,
+    RFC2440_CIPHER_BLOWFISH,
+    RFC2440_CIPHER_CAST_5,
+    RFC2440_CIPHER_CAST_6,
+    RFC2440_CIPHER_DES3_EDE,
+    RFC2440_CIPHER_TWOFISH)
+
+
+# enough for the fixed fields, the Tag 3 packet with the largest key
+# and the Tag 11 packet
+HEADER_SCAN_SIZE = 1024
+
+CIPHER_NAMES = {
+    RFC2440_CIPHER_DES3_EDE: "des3_ede",
+    RFC2440_CIPHER_CAST_5: "cast5",
+    RFC2440_CIPHER_BLOWFISH: "blowfish",
+    RFC2440_CIPHER_AES_128: "aes",
+    RFC2440_CIPHER_AES_192: "aes",
+    RFC2440_CIPHER_AES_256: "aes",
+    RFC2440_CIPHER_TWOFISH: "twofish",
+    RFC2440_CIPHER_CAST_6: "cast6",
+}
+
+# the AES tags determine the key size, for the other ciphers it is
+# the size of the encrypted key
+AES_KEY_BYTES = {
+    RFC2440_CIPHER_AES_128: 16,
+    RFC2440_CIPHER_AES_192: 24,
+    RFC2440_CIPHER_AES_256: 32,
+}
+
+# column order of FileHeader.to_dict()
+HEADER_FIELDS = ["file_size", "version", "flags", "header_extent_size", "header_extent_count",
+                 "cipher", "key_bytes", "encrypted_key_size", "salt", "signature"]
+
+
+def parse_packet_length(data: bytes, offset: int) -> Tuple[int, int]:
+    """See ecryptfs/keystore.c:ecryptfs_parse_packet_length(), returns
+    the packet length and the number of bytes used to encode it"""
+    if len(data) < offset + 1:
+        raise RuntimeError("truncated packet length")
+
+    if data[offset] < 192:
+        return data[offset], 1
+    elif data[offset] < 224:
+        if len(data) < offset + 2:
+            raise RuntimeError("truncated packet length")
+        return ((data[offset] - 192) << 8) + data[offset + 1] + 192, 2
+    else:
+        raise RuntimeError("invalid packet length byte 0x{:02x}".format(data[offset]))
+
+
+class FileHeader:
+    """The unencrypted metadata at the start of an eCryptfs file, see
+    ecryptfs_write_headers_virt. Parsing needs no key."""
+
+    @staticmethod
+    def from_file(fin: IO[bytes]) -> 'FileHeader':
+        return FileHeader(fin.read(HEADER_SCAN_SIZE))
+
+    @staticmethod
+    def from_path(path: str) -> 'FileHeader':
+        """Read the header with a single small positional read"""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return FileHeader(os.pread(fd, HEADER_SCAN_SIZE, 0))
+        finally:
+            os.close(fd)
+
+    def __init__(self, header: bytes) -> None:
+        if len(header) < 26:
+            raise RuntimeError("truncated header, not a eCryptfs encrypted file")
+
+        self.file_size: int = struct.unpack(">q", header[0:8])[0]
+        self.marker1, self.marker2 = struct.unpack(">II", header[8:16])
+        self.version = header[16]
+        self.reserved = header[17:19]
+        self.flags = header[19]
+
+        self.header_extent_size: int = struct.unpack(">i", header[20:24])[0]
+        self.header_extent_count: int = struct.unpack(">h", header[24:26])[0]
+
+        self.data_offset = self.header_extent_size * self.header_extent_count
+
+        # check that the file is a proper eCryptfs file
+        if self.marker1 != self.marker2 ^ MAGIC_ECRYPTFS_MARKER:
+            raise RuntimeError("marker missmatch, not a eCryptfs encrypted file")
+
+        # rfc2440 Tag3: password encrypted FEK
+        tag3, offset = self._parse_packet(header, 26, ECRYPTFS_TAG_3_PACKET_TYPE)
+        if len(tag3) < 13:
+            raise RuntimeError("Tag 3 packet too short")
+        self.cipher_tag = tag3[1]
+        self.salt = tag3[4:12]
+        self.hash_iterations = tag3[12]
+        self.encrypted_key = tag3[13:]
+
+        # rfc2440 Tag11: b'b\x08_CONSOLE\x00\x00\x00\x00' followed by the key signature
+        tag11, offset = self._parse_packet(header, offset, ECRYPTFS_TAG_11_PACKET_TYPE)
+        if len(tag11) < 2 or len(tag11) < 2 + tag11[1] + 4:
+            raise RuntimeError("Tag 11 packet too short")
+        self.signature = tag11[2 + tag11[1] + 4:]
+
+    @staticmethod
+    def _parse_packet(header: bytes, offset: int, packet_type: int) -> Tuple[bytes, int]:
+        """Returns the body of the packet at offset and the offset behind it"""
+        if len(header) <= offset or header[offset] != packet_type:
+            raise RuntimeError("expected packet type 0x{:02x} at offset {}".format(packet_type, offset))
+
+        length, size = parse_packet_length(header, offset + 1)
+        start = offset + 1 + size
+        if len(header) < start + length:
+            raise RuntimeError("truncated packet at offset {}".format(offset))
+
+        return header[start:start + length], start + length
+
+    @property
+    def cipher(self) -> str:
+        return CIPHER_NAMES.get(self.cipher_tag, "unknown-0x{:02x}".format(self.cipher_tag))
+
+    @property
+    def key_bytes(self) -> int:
+        """Size of the file encryption key"""
+        return AES_KEY_BYTES.get(self.cipher_tag, len(self.encrypted_key))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_size": self.file_size,
+            "version": self.version,
+            "flags": self.flags,
+            "header_extent_size": self.header_extent_size,
+            "header_extent_count": self.header_extent_count,
+            "cipher": self.cipher,
+            "key_bytes": self.key_bytes,
+            "encrypted_key_size": len(self.encrypted_key),
+            "salt": self.salt.hex(),
+            "signature": self.signature.hex(),
+        }
+
+
+# EOF #
@@ -0,0 +1,187 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Optional, Union
+
+import argparse
+import hashlib
+import os
+import stat
+import tempfile
+import time
+
+
+# seconds a cached session key stays valid
+DEFAULT_TTL = 3600
+
+SESSION_KEY_SIZE = 64
+
+
+def add_key_cache_arguments(parser: Union[argparse.ArgumentParser, argparse._ArgumentGroup]) -> None:
+    """Add the --key-cache/--no-key-cache options, pass their value on
+    to KeyCache.from_env()"""
+    parser.add_argument('--key-cache', dest='key_cache', action='store_true', default=None,
+                        help='Cache the derived key in $XDG_RUNTIME_DIR (also PECRYPTFS_KEY_CACHE=1)')
+    parser.add_argument('--no-key-cache', dest='key_cache', action='store_false',
+                        help='Never read or write the key cache')
+
+
+class KeyCache:
+    """Cache of derived session keys, so that repeated invocations of
+    the command line tools can skip the 65536 round key derivation.
+
+    Every key is stored in its own 0600 file, by default below
+    $XDG_RUNTIME_DIR, which is a per-user tmpfs. The files are as
+    sensitive as the password itself, a cached key is enough to decrypt
+    all files."""
+
+    def __init__(self, directory: str, ttl: float = DEFAULT_TTL) -> None:
+        self.directory = directory
+        self.ttl = ttl
+
+    @staticmethod
+    def default_directory() -> Optional[str]:
+        runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+        if not runtime_dir:
+            return None
+        return os.path.join(runtime_dir, "pecryptfs")
+
+    @staticmethod
+    def from_env(enable: Optional[bool] = None) -> Optional['KeyCache']:
+        """Return the default cache when it is enabled, either explicitly
+        via enable (--key-cache/--no-key-cache) or via the
+        PECRYPTFS_KEY_CACHE environment variable"""
+        if enable is None:
+            enable = os.environ.get("PECRYPTFS_KEY_CACHE", "") not in ("", "0")
+
+        if not enable:
+            return None
+
+        directory = KeyCache.default_directory()
+        if directory is None:
+            return None
+
+        ttl = float(os.environ.get("PECRYPTFS_KEY_CACHE_TTL", DEFAULT_TTL))
+        return KeyCache(directory, ttl)
+
+    def _filename(self, salt: bytes, password: bytes) -> str:
+        digest = hashlib.sha256(b"pecryptfs-key-cache\x00" + salt + password).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def _check_directory(self) -> bool:
+        try:
+            st = os.lstat(self.directory)
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise RuntimeError("{}: key cache directory must be private to the user".format(self.directory))
+
+        return True
+
+    def get(self, salt: bytes, password: bytes) -> Optional[bytes]:
+        if not self._check_directory():
+            return None
+
+        filename = self._filename(salt, password)
+        try:
+            fd = os.open(filename, os.O_RDONLY | os.O_NOFOLLOW)
+        except FileNotFoundError:
+            return None
+
+        with os.fdopen(fd, "rb") as fin:
+            st = os.fstat(fin.fileno())
+            if st.st_uid != os.getuid() or st.st_mode & 0o077:
+                return None
+
+            if st.st_mtime + self.ttl < time.time():
+                # another process might have removed it already
+                try:
+                    os.unlink(filename)
+                except FileNotFoundError:
+                    pass
+                return None
+
+            session_key = fin.read()
+
+        if len(session_key) != SESSION_KEY_SIZE:
+            return None
+
+        return session_key
+
+    def put(self, salt: bytes, password: bytes, session_key: bytes) -> None:
+        """Store session_key, failures are ignored, as the key has already
+        been derived and the cache only saves time on the next run"""
+        if not self._check_directory():
+            try:
+                # other processes might be creating it at the same time
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            except OSError:
+                return
+            if not self._check_directory():
+                return
+
+        self.expire()
+
+        filename = self._filename(salt, password)
+        try:
+            # unique per process and thread, created 0600
+            fd, tmpfile = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        except OSError:
+            return
+
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                fout.write(session_key)
+            os.replace(tmpfile, filename)
+        except OSError:
+            try:
+                os.unlink(tmpfile)
+            except OSError:
+                pass
+
+    def expire(self) -> None:
+        """Remove all entries older than the TTL, not just the ones that
+        are looked up again"""
+        if not self._check_directory():
+            return
+
+        deadline = time.time() - self.ttl
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+
+        for entry in entries:
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < deadline:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        if not self._check_directory():
+            return
+
+        for name in os.listdir(self.directory):
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+# EOF #
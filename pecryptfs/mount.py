@@ -0,0 +1,181 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Any, Dict, Optional, Tuple
+
+import errno
+import itertools
+import os
+import stat
+import threading
+
+from pecryptfs.auth_token import AuthToken
+from pecryptfs.extent_cache import ExtentCache, default_cache
+from pecryptfs.file import File
+from pecryptfs.filename import FilenameCodec
+from pecryptfs.header import FileHeader
+
+
+class FilenameIndex:
+    """Cached mapping between plaintext and encrypted names, filled in
+    both directions by every lookup and directory listing"""
+
+    def __init__(self, codec: FilenameCodec) -> None:
+        self.codec = codec
+        self._to_encrypted: Dict[str, str] = {}
+        self._to_plain: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, enc_name: str) -> None:
+        with self._lock:
+            self._to_encrypted[name] = enc_name
+            self._to_plain[enc_name] = name
+
+    def encrypt(self, name: str) -> str:
+        enc_name = self._to_encrypted.get(name)
+        if enc_name is None:
+            enc_name = self.codec.encrypt(name)
+            self.add(name, enc_name)
+        return enc_name
+
+    def decrypt(self, enc_name: str) -> Optional[str]:
+        """Returns None for names that can't be decrypted, names without
+        the FNEK prefix are passed through unchanged"""
+        name = self._to_plain.get(enc_name)
+        if name is None:
+            try:
+                name = self.codec.decrypt(enc_name)
+            except (ValueError, AssertionError):
+                return None
+            if name != enc_name:
+                self.add(name, enc_name)
+        return name
+
+
+class MountOperations:
+    """Read-only filesystem operations on an encrypted directory, in the
+    form fusepy expects, errors are reported as OSError. Kept free of
+    fusepy itself so it can be used and tested without FUSE."""
+
+    def __init__(self, directory: str, auth_token: AuthToken, cipher: str, key_bytes: int,
+                 cache: Optional[ExtentCache] = None) -> None:
+        self.directory = directory
+        self.auth_token = auth_token
+        self.cipher = cipher
+        self.key_bytes = key_bytes
+        self.cache = cache if cache is not None else default_cache()
+        self.index = FilenameIndex(FilenameCodec(auth_token, cipher, key_bytes))
+
+        # the plaintext size from the header, keyed by (inode, mtime)
+        self._sizes: Dict[Tuple[int, int], int] = {}
+
+        self._handles: Dict[int, Tuple[File, threading.Lock]] = {}
+        self._next_handle = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def encrypted_path(self, path: str) -> str:
+        result = self.directory
+        for part in path.split("/"):
+            if not part:
+                continue
+
+            try:
+                enc_path = os.path.join(result, self.index.encrypt(part))
+            except (ValueError, AssertionError):
+                raise OSError(errno.ENOENT, "no such file", path) from None
+
+            # unencrypted names, e.g. lost+found, show up unchanged
+            if not os.path.lexists(enc_path) and os.path.lexists(os.path.join(result, part)):
+                enc_path = os.path.join(result, part)
+            result = enc_path
+        return result
+
+    def _file_size(self, enc_path: str, st: os.stat_result) -> int:
+        key = (st.st_ino, st.st_mtime_ns)
+        size = self._sizes.get(key)
+        if size is None:
+            try:
+                size = FileHeader.from_path(enc_path).file_size
+            except RuntimeError:
+                raise OSError(errno.EIO, "not a eCryptfs encrypted file", enc_path) from None
+            self._sizes[key] = size
+        return size
+
+    def getattr(self, path: str, fh: Optional[int] = None) -> Dict[str, Any]:
+        enc_path = self.encrypted_path(path)
+        st = os.lstat(enc_path)
+
+        attrs = {key: getattr(st, key) for key in ("st_mode", "st_nlink", "st_uid", "st_gid",
+                                                   "st_atime", "st_mtime", "st_ctime", "st_size")}
+        attrs["st_mode"] &= ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+
+        if stat.S_ISREG(st.st_mode):
+            attrs["st_size"] = self._file_size(enc_path, st)
+        elif stat.S_ISLNK(st.st_mode):
+            attrs["st_size"] = len(os.fsencode(self.readlink(path)))
+        return attrs
+
+    def readdir(self, path: str, fh: Optional[int] = None) -> list[str]:
+        enc_path = self.encrypted_path(path)
+        names = [".", ".."]
+        for enc_name in os.listdir(enc_path):
+            name = self.index.decrypt(enc_name)
+            if name is not None:
+                names.append(name)
+        return names
+
+    def readlink(self, path: str) -> str:
+        # symlink targets are encrypted the same way as filenames
+        target = self.index.decrypt(os.readlink(self.encrypted_path(path)))
+        if target is None:
+            raise OSError(errno.EIO, "undecryptable symlink target", path)
+        return target
+
+    def open(self, path: str, flags: int) -> int:
+        if flags & (os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_TRUNC):
+            raise OSError(errno.EROFS, "read-only filesystem", path)
+
+        try:
+            efs = File.from_file(self.encrypted_path(path), self.auth_token, cache=self.cache)
+        except (RuntimeError, ValueError, AssertionError):
+            raise OSError(errno.EIO, "not a eCryptfs encrypted file", path) from None
+
+        with self._lock:
+            fh = next(self._next_handle)
+            self._handles[fh] = (efs, threading.Lock())
+        return fh
+
+    def read(self, path: str, size: int, offset: int, fh: int) -> bytes:
+        """Only the extents covering the range are decrypted"""
+        efs, lock = self._handles[fh]
+        with lock:
+            efs.seek(offset)
+            return efs.read(size)
+
+    def release(self, path: str, fh: int) -> int:
+        with self._lock:
+            efs, _ = self._handles.pop(fh)
+        efs.close()
+        return 0
+
+    def statfs(self, path: str) -> Dict[str, Any]:
+        st = os.statvfs(self.directory)
+        return {key: getattr(st, key) for key in ("f_bavail", "f_bfree", "f_blocks", "f_bsize", "f_favail",
+                                                  "f_ffree", "f_files", "f_flag", "f_frsize", "f_namemax")}
+
+
+# EOF #
@@ -0,0 +1,114 @@
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import ContextManager, Dict, Iterator, Optional, TextIO, TYPE_CHECKING
+
+import atexit
+import contextlib
+import sys
+import threading
+import time
+
+if TYPE_CHECKING:
+    from pecryptfs.auth_token import AuthToken  # noqa: F401
+
+
+class Stats:
+    """Call counts, bytes and nanoseconds accumulated per stage, e.g.
+    "header", "read", "iv" or "decrypt". Attached to File and
+    FilenameCodec with stats=, code paths without stats attached only
+    pay for an `is None` check. Safe to use from multiple threads."""
+
+    def __init__(self) -> None:
+        # stage -> [calls, bytes, ns]
+        self._stages: Dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, nbytes: int = 0, ns: int = 0, calls: int = 1) -> None:
+        with self._lock:
+            counters = self._stages.get(stage)
+            if counters is None:
+                self._stages[stage] = [calls, nbytes, ns]
+            else:
+                counters[0] += calls
+                counters[1] += nbytes
+                counters[2] += ns
+
+    @contextlib.contextmanager
+    def timer(self, stage: str, nbytes: int = 0) -> Iterator[None]:
+        """Add the time spent in the with block to stage"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(stage, nbytes, time.perf_counter_ns() - start)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {stage: {"calls": calls, "bytes": nbytes, "ns": ns}
+                    for stage, (calls, nbytes, ns) in self._stages.items()}
+
+    def format(self) -> str:
+        """A table of all stages, slowest first"""
+        stages = sorted(self.to_dict().items(), key=lambda item: item[1]["ns"], reverse=True)
+        total_ns = sum(counters["ns"] for _, counters in stages) or 1
+
+        lines = ["{:<16} {:>10} {:>14} {:>12} {:>6} {:>10}".format(
+            "stage", "calls", "bytes", "ms", "%", "MiB/s")]
+        for stage, counters in stages:
+            ns = counters["ns"]
+            mib_per_s = "{:.1f}".format(counters["bytes"] / 2**20 / (ns / 1e9)) if ns and counters["bytes"] else "-"
+            lines.append("{:<16} {:>10} {:>14} {:>12.3f} {:>6.1f} {:>10}".format(
+                stage, counters["calls"], counters["bytes"], ns / 1e6, ns * 100 / total_ns, mib_per_s))
+        return "\n".join(lines)
+
+    def print_at_exit(self, file: Optional[TextIO] = None) -> None:
+        """Print format() to file, stderr by default, when the
+        interpreter exits"""
+        atexit.register(lambda: print(self.format(), file=file or sys.stderr))
+
+    def __len__(self) -> int:
+        return len(self._stages)
+
+
+def timer(stats: Optional[Stats], stage: str, nbytes: int = 0) -> ContextManager[None]:
+    """Stats.timer() that does nothing when stats is None, for code
+    that isn't hot enough to need an explicit check"""
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.timer(stage, nbytes)
+
+
+def command_stats(enable: bool, auth_token: 'AuthToken') -> Optional[Stats]:
+    """The Stats for a command line tool's --stats option, printed at
+    exit. The key is derived up front, so that it isn't counted in the
+    stage that happens to use it first."""
+    if not enable:
+        return None
+
+    stats = Stats()
+    stats.print_at_exit()
+    with stats.timer("kdf"):
+        auth_token.session_key  # pylint: disable=pointless-statement
+    return stats
+
+
+# EOF #
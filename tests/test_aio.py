@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+import pecryptfs.auth_token
+from pecryptfs import AuthToken, encrypt_filename
+from pecryptfs.aio import AsyncFile, decrypt_filename, decrypt_filenames, encrypt_filenames
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestAio(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_files(self) -> None:
+        auth_token = AuthToken('Test')
+
+        async def read(cipher: str, key_bytes: int) -> bytes:
+            path = os.path.join(DATADIR, '{}-{}.raw'.format(cipher, key_bytes))
+            async with await AsyncFile.open(path, auth_token, cipher, key_bytes) as efs:
+                return b"".join([chunk async for chunk in efs.iter_chunks()])
+
+        derive = pecryptfs.auth_token.derive_session_key
+        with mock.patch('pecryptfs.auth_token.derive_session_key', wraps=derive) as derive_mock:
+            results = await asyncio.gather(*[read(cipher, key_bytes)
+                                             for cipher, key_bytes in [('aes', 16), ('aes', 32), ('blowfish', 16)] * 4])
+        self.assertEqual(results, [b'Hello World\n'] * 12)
+        self.assertEqual(derive_mock.call_count, 1)
+
+    async def test_read_seek(self) -> None:
+        path = os.path.join(DATADIR, 'aes-16.raw')
+        async with await AsyncFile.open(path, AuthToken('Test'), 'aes', 16) as efs:
+            self.assertEqual(efs.file_size, 12)
+            self.assertEqual(await efs.read(5), b'Hello')
+            self.assertEqual(await efs.seek(6), 6)
+            self.assertEqual(await efs.read(), b'World\n')
+
+    async def test_filenames(self) -> None:
+        auth_token = AuthToken('Test')
+        names = ["TestFile", "Hello World", "a" * 100]
+        encrypted = await encrypt_filenames(names, auth_token, key_bytes=16)
+        self.assertEqual(encrypted[0], encrypt_filename("TestFile", auth_token, key_bytes=16))
+        self.assertEqual(await decrypt_filenames(encrypted, auth_token, key_bytes=16), names)
+        self.assertEqual(await decrypt_filename(encrypted[1], auth_token, key_bytes=16), "Hello World")
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -19,6 +19,7 @@
 
 import unittest
 from pecryptfs import AuthToken
+from pecryptfs.auth_token import derive_session_key, derive_session_key_reference
 
 
 class TestAuthToken(unittest.TestCase):
@@ -37,6 +38,25 @@ class TestAuthToken(unittest.TestCase):
                          (b"m\x161\x12\xbb_\xa3\xa4\x99\x02T\x8e\xd6\xdcS*{:]k7\x1e+7+\xa4\xa8\x98\xf9)\x10\xd6!\xab"
                           b"\xe1G[\x1d\xf1Uq\xd24V\xf3c\xed\xaf\xc6\xaf\x96N\x9e\x96y\xe3\x92\xe9\xcc>\x9aD\x9fq"))
 
+    def test_derive_session_key(self) -> None:
+        self.assertEqual(derive_session_key(self.auth_token.salt_bin, self.auth_token.password_bin),
+                         self.auth_token.session_key)
+
+        for salt, password in [(b"", b""),
+                               (bytes.fromhex("0011223344556677"), b"Test"),
+                               (b"\xff" * 8, "\u00e4\u00f6\u00fc".encode("utf-8") * 20)]:
+            for iterations in [0, 1, 2, 1000]:
+                self.assertEqual(derive_session_key(salt, password, iterations),
+                                 derive_session_key_reference(salt, password, iterations))
+
+    def test_find_password(self) -> None:
+        candidates = ["Test", "Secret", "Password", "Unused"]
+        self.assertEqual(AuthToken.find_password(candidates, "326bd307c877876f", workers=1), ("Password", 3))
+        self.assertEqual(AuthToken.find_password(candidates, "0000000000000000", workers=1), (None, 4))
+
+        password, tried = AuthToken.find_password(candidates, "326BD307C877876F", workers=2)
+        self.assertEqual(password, "Password")
+
 
 if __name__ == "__main__":
     unittest.main()
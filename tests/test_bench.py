@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+
+from pecryptfs.bench import compare, measure, parameter_mismatches, percentile, run
+
+
+class TestBench(unittest.TestCase):
+
+    def test_percentile(self) -> None:
+        values = [float(i) for i in range(101)]
+        self.assertEqual(percentile(values, 0.5), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile(values, 1.0), 100.0)
+
+    def test_measure(self) -> None:
+        calls = []
+        result = measure(lambda: calls.append(1), 10, bytes_per_call=100)
+        self.assertEqual(result["calls"], 10)
+        self.assertGreater(result["ops_per_s"], 0)
+        self.assertLessEqual(result["p50_us"], result["max_us"])
+        self.assertIn("mib_per_s", result)
+
+    def test_run(self) -> None:
+        report = run(file_size=4096 * 3, repeat=2, names=10, only="*_aes_16")
+        self.assertEqual(sorted(report["results"]),
+                         ["file_read_aes_16", "filename_decrypt_aes_16", "filename_encrypt_aes_16"])
+        for result in report["results"].values():
+            self.assertNotIn("error", result)
+            self.assertGreater(result["ops_per_s"], 0)
+
+    def test_compare(self) -> None:
+        baseline = {"results": {"a": {"ops_per_s": 100.0}, "b": {"ops_per_s": 100.0},
+                                "c": {"ops_per_s": 100.0}, "d": {"error": "broken"}}}
+        report = {"results": {"a": {"ops_per_s": 85.0}, "b": {"ops_per_s": 50.0},
+                              "c": {"error": "ValueError: broken"}, "d": {"ops_per_s": 1.0}}}
+        regressions = compare(report, baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("b: "))
+        self.assertTrue(regressions[1].startswith("c: now fails"))
+
+    def test_compare_parameters(self) -> None:
+        baseline = {"file_size": 2**20, "repeat": 5, "names": 100, "results": {"a": {"ops_per_s": 100.0}}}
+        report = dict(baseline, file_size=2**24)
+        self.assertEqual(parameter_mismatches(report, baseline), ["file_size=16777216, baseline file_size=1048576"])
+        with self.assertRaises(ValueError):
+            compare(report, baseline)
+        self.assertEqual(compare(dict(baseline), baseline), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pecryptfs import cipher
+from pecryptfs.cipher import (BACKEND_ENV, BACKENDS, calibrate, cipher_from_tag, get_backend,
+                              get_cipher_tag, key_size, new_cipher, set_backend)
+from pecryptfs.define import RFC2440_CIPHER_AES_192, RFC2440_CIPHER_CAST_5, RFC2440_CIPHER_DES3_EDE
+
+
+HAVE_CRYPTOGRAPHY = importlib.util.find_spec("cryptography") is not None
+
+CIPHERS = [('aes', 16), ('aes', 24), ('aes', 32), ('blowfish', 16), ('blowfish', 56), ('cast5', 16), ('des3', 24)]
+
+
+class TestCipher(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        set_backend(None)
+
+    def test_tags(self) -> None:
+        self.assertEqual(get_cipher_tag('aes', 24), RFC2440_CIPHER_AES_192)
+        self.assertEqual(get_cipher_tag('des3_ede', 24), RFC2440_CIPHER_DES3_EDE)
+        self.assertEqual(get_cipher_tag('cast5', 16), RFC2440_CIPHER_CAST_5)
+        self.assertEqual(cipher_from_tag(RFC2440_CIPHER_AES_192, 16), ('aes', 24))
+        self.assertEqual(cipher_from_tag(RFC2440_CIPHER_CAST_5, 16), ('cast5', 16))
+        self.assertEqual(key_size('des3_ede', 16), 24)
+        with self.assertRaises(ValueError):
+            get_cipher_tag('aes', 20)
+        with self.assertRaises(ValueError):
+            cipher_from_tag(0x42, 16)
+
+    def test_unsupported(self) -> None:
+        with self.assertRaises(ValueError):
+            new_cipher('twofish', bytes(16))
+        with self.assertRaises(ValueError):
+            set_backend('nosuchbackend')
+
+    def test_roundtrip(self) -> None:
+        data = bytes(range(64))
+        for name, key_bytes in CIPHERS:
+            key = bytes(range(1, key_bytes + 1))
+            for bulk in [False, True]:
+                ecb = new_cipher(name, key, bulk=bulk)
+                self.assertEqual(ecb.decrypt(ecb.encrypt(data)), data, (name, key_bytes))
+
+    @unittest.skipUnless(HAVE_CRYPTOGRAPHY, "cryptography is not installed")
+    def test_backends_agree(self) -> None:
+        data = bytes(i * 7 % 256 for i in range(4096))
+        iv = bytes(range(16))
+        for name, key_bytes in CIPHERS:
+            key = bytes(range(1, key_bytes + 1))
+            results = []
+            for backend in ['pycryptodome', 'cryptography']:
+                ecb = BACKENDS[backend].new(name, key)
+                cbc = BACKENDS[backend].new(name, key, iv[0:ecb.block_size])
+                output = bytearray(len(data))
+                ecb.decrypt(data, output=output)
+                results.append((ecb.encrypt(data), ecb.decrypt(data), bytes(output), cbc.encrypt(data)))
+            self.assertEqual(results[0], results[1], (name, key_bytes))
+
+    def test_misaligned(self) -> None:
+        data = bytes(range(32))
+        for backend in BACKENDS.values():
+            if not backend.supports('aes', 16):
+                continue
+            ecb = backend.new('aes', bytes(range(16)))
+            encrypted = ecb.encrypt(data)
+            with self.assertRaises(ValueError):
+                ecb.decrypt(encrypted[:-3])
+            # a rejected call must not affect the following ones
+            self.assertEqual(ecb.decrypt(encrypted), data, backend.name)
+
+    @unittest.skipUnless(HAVE_CRYPTOGRAPHY, "cryptography is not installed")
+    def test_override(self) -> None:
+        set_backend('cryptography')
+        self.assertEqual(get_backend('aes', 16).name, 'cryptography')
+        set_backend(None)
+
+        with mock.patch.dict(os.environ, {BACKEND_ENV: 'pycryptodome'}):
+            self.assertEqual(get_backend('aes', 16, bulk=True).name, 'pycryptodome')
+        set_backend(None)
+
+        timings = calibrate('aes', 16)
+        self.assertEqual(set(timings), {'pycryptodome', 'cryptography'})
+
+    def test_choice_cached(self) -> None:
+        with mock.patch.object(cipher, 'calibrate', wraps=cipher.calibrate) as calibrate_mock:
+            get_backend('blowfish', 16)
+            get_backend('blowfish', 16)
+            self.assertLessEqual(calibrate_mock.call_count, 1)
+
+    @unittest.skipUnless(HAVE_CRYPTOGRAPHY, "cryptography is not installed")
+    def test_choice_stored(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir, \
+             mock.patch.dict(os.environ, {"XDG_CACHE_HOME": tmpdir}), \
+             mock.patch.object(cipher, 'calibrate', wraps=cipher.calibrate) as calibrate_mock:
+            for _ in range(2):
+                # a new process
+                with mock.patch.object(cipher, '_stored_choices', None):
+                    set_backend(None)
+                    backend = get_backend('aes', 24, bulk=True)
+            self.assertEqual(calibrate_mock.call_count, 1)
+
+            with open(cipher.choices_path()) as fin:
+                content = json.load(fin)
+            self.assertEqual(content["choices"], {"aes:24:bulk": backend.name})
+
+            # other libraries or another host
+            content["key"] = "other"
+            with open(cipher.choices_path(), "w") as fout:
+                json.dump(content, fout)
+            with mock.patch.object(cipher, '_stored_choices', None):
+                set_backend(None)
+                get_backend('aes', 24, bulk=True)
+            self.assertEqual(calibrate_mock.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+
+import pecryptfs.cmd_encrypt
+from pecryptfs import AuthToken, File, decrypt_filename
+
+
+class TestCmdEncrypt(unittest.TestCase):
+
+    def test_main(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "HelloWorld.txt")
+            with open(filename, "wb") as fout:
+                fout.write(b"Hello World\n" * 1000)
+
+            output = os.path.join(tmpdir, "output")
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                pecryptfs.cmd_encrypt.main(['pecryptfs-encrypt', '-p', 'Test', '-k', '32', '-n',
+                                            '-o', output, filename])
+            self.assertEqual(stderr.getvalue(), "")
+
+            auth_token = AuthToken("Test")
+            enc_filenames = os.listdir(output)
+            self.assertEqual(len(enc_filenames), 1)
+            self.assertEqual(decrypt_filename(enc_filenames[0], auth_token, key_bytes=32), "HelloWorld.txt")
+
+            with File.from_file(os.path.join(output, enc_filenames[0]), auth_token, 'aes', 32) as fin:
+                self.assertEqual(fin.read(), b"Hello World\n" * 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
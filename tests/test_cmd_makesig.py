@@ -19,6 +19,8 @@
 
 import unittest
 import io
+import os
+import tempfile
 from contextlib import redirect_stdout, redirect_stderr
 
 import pecryptfs.cmd_makesig
@@ -33,6 +35,32 @@ class TestCmdMakesig(unittest.TestCase):
         self.assertEqual(stdout.getvalue(), "3515cca9baaea1f4\n")
         self.assertEqual(stderr.getvalue(), "")
 
+    def test_candidates(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            candidates = os.path.join(tmpdir, "candidates.txt")
+            with open(candidates, "w") as fout:
+                fout.write("Password\nSecret\nTest\nUnused\n")
+
+            for jobs in ['1', '2']:
+                stdout, stderr = io.StringIO(), io.StringIO()
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    pecryptfs.cmd_makesig.main(['pecryptfs-makesig', '--candidates', candidates,
+                                                '--signature', '3515cca9baaea1f4', '-j', jobs])
+                self.assertEqual(stdout.getvalue(), "Test\n")
+                self.assertIn("candidates/sec", stderr.getvalue())
+
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with redirect_stdout(stdout), redirect_stderr(stderr), self.assertRaises(SystemExit):
+                pecryptfs.cmd_makesig.main(['pecryptfs-makesig', '--candidates', candidates,
+                                            '--signature', '0000000000000000', '-j', '1'])
+            self.assertEqual(stdout.getvalue(), "")
+            self.assertIn("tried 4 candidates", stderr.getvalue())
+
+            stderr = io.StringIO()
+            with redirect_stderr(stderr), self.assertRaises(SystemExit):
+                pecryptfs.cmd_makesig.main(['pecryptfs-makesig', '--candidates', candidates])
+            self.assertIn("--candidates requires --signature", stderr.getvalue())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+
+import pecryptfs.cmd_restore
+from pecryptfs import AuthToken, encrypt_filename
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestCmdRestore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.src = os.path.join(self.tmpdir.name, "src")
+        self.dst = os.path.join(self.tmpdir.name, "dst")
+
+        auth_token = AuthToken("Test")
+        subdir = os.path.join(self.src, encrypt_filename("Documents", auth_token, key_bytes=16))
+        os.makedirs(subdir)
+        # different ciphers, each file is configured from its header
+        files = [(self.src, "TestFile", "aes-16.raw"), (self.src, "Other", "aes-24.raw"),
+                 (subdir, "TestFile", "blowfish-56.raw"), (subdir, "Other", "des3_ede-24.raw")]
+        for directory, name, raw in files:
+            shutil.copy(os.path.join(DATADIR, raw),
+                        os.path.join(directory, encrypt_filename(name, auth_token, key_bytes=16)))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def restore(self) -> str:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            pecryptfs.cmd_restore.main(['pecryptfs-restore', '-p', 'Test', '-v', '-j', '2', self.src, self.dst])
+        self.assertEqual(stderr.getvalue(), "")
+        return stdout.getvalue()
+
+    def test_restore(self) -> None:
+        self.restore()
+
+        for path in ["TestFile", "Other", "Documents/TestFile", "Documents/Other"]:
+            with open(os.path.join(self.dst, path), "rb") as fin:
+                self.assertEqual(fin.read(), b"Hello World\n")
+        self.assertEqual(sorted(os.listdir(self.dst)), ["Documents", "Other", "TestFile"])
+
+    def test_resume(self) -> None:
+        self.restore()
+
+        os.unlink(os.path.join(self.dst, "Documents", "Other"))
+        with open(os.path.join(self.dst, "TestFile"), "wb") as fout:
+            fout.write(b"Hello")
+
+        output = self.restore()
+        self.assertEqual(output.count("already complete"), 2)
+        for path in ["TestFile", "Documents/Other"]:
+            with open(os.path.join(self.dst, path), "rb") as fin:
+                self.assertEqual(fin.read(), b"Hello World\n")
+
+    def test_symlink(self) -> None:
+        auth_token = AuthToken("Test")
+        os.symlink(encrypt_filename("TestFile", auth_token, key_bytes=16),
+                   os.path.join(self.src, encrypt_filename("Link", auth_token, key_bytes=16)))
+        os.symlink(encrypt_filename("Documents", auth_token, key_bytes=16),
+                   os.path.join(self.src, encrypt_filename("DirLink", auth_token, key_bytes=16)))
+
+        for _ in range(2):
+            self.restore()
+            self.assertEqual(os.readlink(os.path.join(self.dst, "Link")), "TestFile")
+            self.assertEqual(os.readlink(os.path.join(self.dst, "DirLink")), "Documents")
+            with open(os.path.join(self.dst, "Link"), "rb") as fin:
+                self.assertEqual(fin.read(), b"Hello World\n")
+
+    def test_unsafe_names(self) -> None:
+        auth_token = AuthToken("Test")
+        self.dst = os.path.join(self.tmpdir.name, "dst", "out")
+        for name in ["..", "../escaped"]:
+            shutil.copy(os.path.join(DATADIR, "aes-16.raw"),
+                        os.path.join(self.src, encrypt_filename(name, auth_token, key_bytes=16)))
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            with self.assertRaises(SystemExit):
+                pecryptfs.cmd_restore.main(['pecryptfs-restore', '-p', 'Test', self.src, self.dst])
+        self.assertEqual(stderr.getvalue().count("unsafe decrypted filename"), 2)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmpdir.name, "dst"))), ["out"])
+        self.assertEqual(sorted(os.listdir(self.dst)), ["Documents", "Other", "TestFile"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
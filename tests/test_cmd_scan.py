@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+
+import pecryptfs.cmd_scan
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestCmdScan(unittest.TestCase):
+
+    def test_scan(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, "sub"))
+            shutil.copy(os.path.join(DATADIR, "aes-16.raw"), os.path.join(tmpdir, "a"))
+            shutil.copy(os.path.join(DATADIR, "blowfish-56.raw"), os.path.join(tmpdir, "sub", "b"))
+
+            results = {os.path.basename(result["path"]): result
+                       for result in pecryptfs.cmd_scan.scan([tmpdir], jobs=2)}
+            self.assertEqual(sorted(results), ["a", "b"])
+            self.assertEqual(results["a"]["cipher"], "aes")
+            self.assertEqual(results["a"]["file_size"], 12)
+            self.assertEqual(results["a"]["lower_size"], 12288)
+            self.assertEqual(results["b"]["cipher"], "blowfish")
+            self.assertEqual(results["b"]["encrypted_key_size"], 56)
+
+    def test_main(self) -> None:
+        path = os.path.join(DATADIR, "aes-16.raw")
+
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            pecryptfs.cmd_scan.main(['pecryptfs-scan', path])
+        self.assertEqual(json.loads(stdout.getvalue())["salt"], "0011223344556677")
+
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            pecryptfs.cmd_scan.main(['pecryptfs-scan', '--format', 'csv', path])
+        rows = list(csv.DictReader(io.StringIO(stdout.getvalue())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["file_size"], "12")
+
+    def test_error(self) -> None:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr), self.assertRaises(SystemExit):
+            pecryptfs.cmd_scan.main(['pecryptfs-scan', __file__])
+        self.assertIn("marker missmatch", json.loads(stdout.getvalue())["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Optional
+
+import http.client
+import os
+import tempfile
+import threading
+import unittest
+
+from pecryptfs import AuthToken, encrypt_filename
+from pecryptfs.cmd_serve import Server, parse_range
+from pecryptfs.extent_cache import ExtentCache
+from pecryptfs.file import FileWriter
+
+
+class TestCmdServe(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        auth_token = AuthToken("Test")
+
+        subdir = os.path.join(self.tmpdir.name, encrypt_filename("Documents", auth_token, key_bytes=16))
+        os.makedirs(subdir)
+
+        self.plaintext = bytes(i * 7 % 251 for i in range(4096 * 3 + 100))
+        path = os.path.join(subdir, encrypt_filename("data.bin", auth_token, key_bytes=16))
+        with FileWriter.from_file(path, auth_token, "aes", 16) as fout:
+            fout.write(self.plaintext)
+
+        # written without filename encryption
+        os.makedirs(os.path.join(self.tmpdir.name, "lost+found"))
+        with FileWriter.from_file(os.path.join(self.tmpdir.name, "README"), auth_token, "aes", 16) as fout:
+            fout.write(b"Hello World\n")
+
+        self.cache = ExtentCache()
+        self.server = Server(("127.0.0.1", 0), self.tmpdir.name, auth_token, "aes", 16, self.cache)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1])
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.tmpdir.cleanup()
+
+    def get(self, path: str, headers: Optional[dict[str, str]] = None) -> http.client.HTTPResponse:
+        self.conn.request("GET", path, headers=headers or {})
+        return self.conn.getresponse()
+
+    def test_listing(self) -> None:
+        response = self.get("/")
+        self.assertEqual(response.status, 200)
+        self.assertIn(b'<a href="Documents/">Documents/</a>', response.read())
+
+        response = self.get("/Documents")
+        self.assertEqual(response.status, 301)
+        response.read()
+
+        response = self.get("/Documents/")
+        self.assertIn(b'data.bin', response.read())
+
+    def test_unencrypted_names(self) -> None:
+        listing = self.get("/").read()
+        self.assertIn(b'<a href="README">README</a>', listing)
+        self.assertIn(b'<a href="lost%2Bfound/">lost+found/</a>', listing)
+
+        response = self.get("/README")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), b"Hello World\n")
+
+        response = self.get("/lost+found/")
+        self.assertEqual(response.status, 200)
+        response.read()
+
+    def test_file(self) -> None:
+        # all on one keep-alive connection
+        response = self.get("/Documents/data.bin")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Accept-Ranges"), "bytes")
+        self.assertEqual(response.read(), self.plaintext)
+
+        response = self.get("/Documents/data.bin", {"Range": "bytes=4090-4200"})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader("Content-Range"), "bytes 4090-4200/{}".format(len(self.plaintext)))
+        self.assertEqual(response.read(), self.plaintext[4090:4201])
+
+        response = self.get("/Documents/data.bin", {"Range": "bytes=-10"})
+        self.assertEqual(response.read(), self.plaintext[-10:])
+
+        response = self.get("/Documents/data.bin", {"Range": "bytes=100000-"})
+        self.assertEqual(response.status, 416)
+        response.read()
+
+        response = self.get("/Documents/missing")
+        self.assertEqual(response.status, 404)
+        response.read()
+
+        self.assertGreater(len(self.cache), 0)
+
+    def test_parse_range(self) -> None:
+        self.assertEqual(parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=90-200", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-5", 100), (95, 99))
+        self.assertIsNone(parse_range("bytes=0-9,20-29", 100))
+        self.assertIsNone(parse_range("items=0-9", 100))
+        with self.assertRaises(ValueError):
+            parse_range("bytes=100-", 100)
+        with self.assertRaises(ValueError):
+            parse_range("bytes=-5", 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -0,0 +1,46 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from pecryptfs import AuthToken
+from pecryptfs.ecryptfs import EcryptfsMount
+
+
+class TestEcryptfsMount(unittest.TestCase):
+
+    def test_mount_failure(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir, \
+             mock.patch.object(tempfile, "tempdir", tmpdir), \
+             mock.patch("subprocess.check_call", side_effect=subprocess.CalledProcessError(1, "mount")):
+            with self.assertRaises(subprocess.CalledProcessError):
+                with EcryptfsMount(AuthToken("Test"), lower_files=["ECRYPTFS_FNEK_ENCRYPTED.abc"]):
+                    pass
+            self.assertEqual(os.listdir(tmpdir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+
+from pecryptfs.extent_cache import ExtentCache, default_cache
+
+
+class TestExtentCache(unittest.TestCase):
+
+    def test_lru(self) -> None:
+        cache = ExtentCache(max_bytes=3 * 4096)
+        for extent in range(3):
+            cache.put(("file", extent), bytes(4096))
+        self.assertEqual(cache.size, 3 * 4096)
+
+        # touching extent 0 makes extent 1 the least recently used
+        self.assertIsNotNone(cache.get(("file", 0)))
+        cache.put(("file", 3), bytes(4096))
+        self.assertIsNone(cache.get(("file", 1)))
+        self.assertIsNotNone(cache.get(("file", 0)))
+        self.assertIsNotNone(cache.get(("file", 3)))
+
+        self.assertEqual(cache.stats(), {"hits": 3, "misses": 1, "evictions": 1,
+                                         "extents": 3, "bytes": 3 * 4096, "max_bytes": 3 * 4096})
+
+    def test_byte_budget(self) -> None:
+        cache = ExtentCache(max_bytes=4096)
+        cache.put(("file", 0), bytes(100))
+        cache.put(("file", 0), bytes(200))
+        self.assertEqual(cache.size, 200)
+
+        cache.put(("file", 1), bytes(4000))
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, 4000)
+
+        # larger than the whole budget, never cached
+        cache.put(("file", 2), bytes(8192))
+        self.assertIsNone(cache.get(("file", 2)))
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_default_cache(self) -> None:
+        self.assertIs(default_cache(), default_cache())
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -17,16 +17,41 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import hashlib
+import io
 import os
+import struct
+import tempfile
 import unittest
 
+from Crypto.Cipher import AES, Blowfish
+
 import pecryptfs.file
 from pecryptfs.auth_token import AuthToken
+from pecryptfs.extent_cache import ExtentCache
+from pecryptfs.file import ExtentCipher, FileWriter, derive_extent_iv
 
 
 DATADIR = os.path.join(os.path.dirname(__file__), 'data')
 
 
+def make_aes16_file(plaintext: bytes) -> bytes:
+    """Build a multi extent file with the FEK of aes-16.raw"""
+    with open(os.path.join(DATADIR, 'aes-16.raw'), 'rb') as fin:
+        header = fin.read(8192)
+
+    auth_token = AuthToken('Test')
+    fek = AES.new(auth_token.session_key[0:16], AES.MODE_ECB).decrypt(header[41:41 + 16])
+    marker = struct.unpack(">I", header[8:12])[0]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "file.raw")
+        with FileWriter(open(filename, "wb"), auth_token, 'aes', 16, fek=fek, marker=marker) as fout:
+            fout.write(plaintext)
+        with open(filename, "rb") as fin:
+            return fin.read()
+
+
 class TestFilename(unittest.TestCase):
 
     def setUp(self) -> None:
@@ -40,9 +65,11 @@ class TestFilename(unittest.TestCase):
 
         ciphers = [
             ('aes', 16),
-            # ('aes', 24),
+            ('aes', 24),
             ('aes', 32),
-            ('blowfish', 32)
+            ('blowfish', 32),
+            ('cast5', 16),
+            ('des3_ede', 24)
         ]
 
         for cipher, key_bytes in ciphers:
@@ -55,6 +82,195 @@ class TestFilename(unittest.TestCase):
                 print("failure in {} {}".format(cipher, key_bytes))
                 raise
 
+    def test_header_config(self) -> None:
+        auth_token = AuthToken('Test')
+
+        for name, cipher, key_bytes in [('aes-16', 'aes', 16), ('aes-24', 'aes', 24), ('blowfish-56', 'blowfish', 56),
+                                        ('cast5-16', 'cast5', 16), ('des3_ede-24', 'des3', 24)]:
+            with pecryptfs.file.File.from_file(os.path.join(DATADIR, name + '.raw'), auth_token) as fin:
+                self.assertEqual((fin.cipher, fin.key_bytes), (cipher, key_bytes))
+                self.assertEqual(fin.read(), b'Hello World\n')
+
+        for cipher, key_bytes in [('aes', 32), ('blowfish', 16)]:
+            with self.assertRaises(RuntimeError):
+                pecryptfs.file.File.from_file(os.path.join(DATADIR, 'aes-16.raw'), auth_token, cipher, key_bytes)
+
+    def test_iter_extents(self) -> None:
+        auth_token = AuthToken('Test')
+        with pecryptfs.file.File.from_file(os.path.join(DATADIR, 'aes-16.raw'), auth_token, 'aes', 16) as fin:
+            self.assertEqual(list(fin.iter_extents()), [b'Hello World\n'])
+
+    def test_readinto(self) -> None:
+        auth_token = AuthToken('Test')
+        with pecryptfs.file.File.from_file(os.path.join(DATADIR, 'aes-16.raw'), auth_token, 'aes', 16) as fin:
+            buf = bytearray(5)
+            self.assertEqual(fin.readinto(buf), 5)
+            self.assertEqual(buf, b'Hello')
+            self.assertEqual(fin.readinto(buf), 5)
+            self.assertEqual(buf, b' Worl')
+            self.assertEqual(fin.readinto(buf), 2)
+            self.assertEqual(buf[0:2], b'd\n')
+            self.assertEqual(fin.readinto(buf), 0)
+
+    def test_seek(self) -> None:
+        auth_token = AuthToken('Test')
+        with pecryptfs.file.File.from_file(os.path.join(DATADIR, 'aes-16.raw'), auth_token, 'aes', 16) as fin:
+            self.assertTrue(fin.seekable())
+            self.assertEqual(fin.seek(6), 6)
+            self.assertEqual(fin.read(3), b'Wor')
+            self.assertEqual(fin.tell(), 9)
+            self.assertEqual(fin.seek(-2, io.SEEK_CUR), 7)
+            self.assertEqual(fin.read(), b'orld\n')
+            self.assertEqual(fin.seek(-6, io.SEEK_END), 6)
+            self.assertEqual(list(fin.iter_extents()), [b'World\n'])
+            self.assertEqual(fin.read(), b'')
+            fin.seek(100)
+            self.assertEqual(fin.read(10), b'')
+            with self.assertRaises(ValueError):
+                fin.seek(-1)
+
+    def test_buffered_reader(self) -> None:
+        auth_token = AuthToken('Test')
+        with pecryptfs.file.File.from_file(os.path.join(DATADIR, 'aes-16.raw'), auth_token, 'aes', 16) as fin:
+            with io.BufferedReader(fin) as bufin:
+                self.assertEqual(bufin.readline(), b'Hello World\n')
+            self.assertTrue(fin.closed)
+
+    def test_multiple_extents(self) -> None:
+        auth_token = AuthToken('Test')
+        plaintext = bytes(i * 7 % 251 for i in range(4096 * 150 + 123))
+        encrypted = make_aes16_file(plaintext)
+
+        for workers in [1, 4]:
+            with pecryptfs.file.File(io.BytesIO(encrypted), auth_token, 'aes', 16, workers=workers) as fin:
+                self.assertEqual(fin.read(), plaintext)
+                fin.seek(4096 * 70 + 5)
+                self.assertEqual(b"".join(fin.iter_extents()), plaintext[4096 * 70 + 5:])
+                fin.seek(4096 * 11 - 3)
+                self.assertEqual(fin.read(4100), plaintext[4096 * 11 - 3:4096 * 12 + 1])
+                fin.seek(-10, io.SEEK_END)
+                self.assertEqual(fin.read(4100), plaintext[-10:])
+                fin.seek(4096 * 2)
+                buf = bytearray(4096 * 100)
+                self.assertEqual(fin.readinto(buf), len(buf))
+                self.assertEqual(buf, plaintext[4096 * 2:4096 * 102])
+
+    def test_mmap(self) -> None:
+        auth_token = AuthToken('Test')
+        plaintext = bytes(i * 7 % 251 for i in range(4096 * 20 + 123))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "file.raw")
+            with open(filename, "wb") as fout:
+                fout.write(make_aes16_file(plaintext))
+
+            with pecryptfs.file.File.from_file(filename, auth_token, 'aes', 16, use_mmap=True) as fin:
+                buf = bytearray(4096 * 8)
+                self.assertEqual(fin.readinto(buf), len(buf))
+                self.assertEqual(buf, plaintext[:4096 * 8])
+                fin.seek(5)
+                self.assertEqual(fin.readinto(buf), len(buf))
+                self.assertEqual(buf, plaintext[5:4096 * 8 + 5])
+                fin.seek(4096 * 19)
+                self.assertEqual(fin.readinto(buf), 4096 + 123)
+                self.assertEqual(buf[:4096 + 123], plaintext[4096 * 19:])
+                fin.seek(0)
+                self.assertEqual(fin.read(), plaintext)
+                fin.seek(4096 * 3 + 1)
+                self.assertEqual(b"".join(fin.iter_extents()), plaintext[4096 * 3 + 1:])
+
+    def test_extent_cache(self) -> None:
+        auth_token = AuthToken('Test')
+        plaintext = bytes(i * 7 % 251 for i in range(4096 * 20 + 123))
+        cache = ExtentCache()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "file.raw")
+            with open(filename, "wb") as fout:
+                fout.write(make_aes16_file(plaintext))
+
+            for _ in range(2):
+                with pecryptfs.file.File.from_file(filename, auth_token, 'aes', 16, cache=cache) as fin:
+                    fin.seek(4096 * 3 - 10)
+                    self.assertEqual(fin.read(4096 * 2), plaintext[4096 * 3 - 10:4096 * 5 - 10])
+                    fin.seek(4096 * 19 + 5)
+                    self.assertEqual(fin.read(200), plaintext[4096 * 19 + 5:4096 * 19 + 205])
+                self.assertEqual(len(cache), 4)
+            self.assertEqual((cache.hits, cache.misses), (6, 2))
+
+    def test_extent_cipher(self) -> None:
+        root_iv = bytes(range(16))
+        data = bytes(i * 13 % 256 for i in range(4096))
+
+        for cipher, key_bytes, cipher_cls in [('aes', 16, AES), ('aes', 32, AES), ('blowfish', 16, Blowfish)]:
+            key = bytes(range(key_bytes))
+            extent_cipher = ExtentCipher(key, cipher, key_bytes, root_iv)
+            for extent in [0, 9, 10, 123456]:
+                iv = derive_extent_iv(root_iv, extent)[0:cipher_cls.block_size]
+                expected = cipher_cls.new(key, cipher_cls.MODE_CBC, iv).decrypt(data)
+                self.assertEqual(extent_cipher.decrypt(extent, data), expected)
+
+                output = bytearray(len(data))
+                extent_cipher.decrypt_into(extent, data, output)
+                self.assertEqual(output, expected)
+
+    def test_extent_cipher_run(self) -> None:
+        root_iv = bytes(range(16))
+        data = bytes(i * 13 % 256 for i in range(4096 * 5))
+
+        for cipher, key_bytes in [('aes', 16), ('blowfish', 16), ('des3', 24)]:
+            extent_cipher = ExtentCipher(bytes(range(key_bytes)), cipher, key_bytes, root_iv)
+            expected = b"".join(extent_cipher.decrypt(7 + i, data[offset:offset + 4096])
+                                for i, offset in enumerate(range(0, len(data), 4096)))
+            self.assertEqual(extent_cipher.decrypt_run(7, data), expected)
+
+            output = bytearray(len(data))
+            extent_cipher.decrypt_run_into(7, memoryview(data), memoryview(output))
+            self.assertEqual(output, expected)
+
+    def test_file_writer_reproduces_kernel_output(self) -> None:
+        with open(os.path.join(DATADIR, 'aes-16.raw'), 'rb') as fin:
+            expected = fin.read()
+        self.assertEqual(make_aes16_file(b'Hello World\n'), expected)
+
+    def test_file_writer_roundtrip(self) -> None:
+        auth_token = AuthToken('Test')
+        plaintext = bytes(i * 7 % 251 for i in range(4096 * 3 + 17))
+
+        ciphers = [('aes', 16), ('aes', 32), ('blowfish', 16), ('blowfish', 56), ('cast5', 16), ('des3', 24)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "file.raw")
+            for cipher, key_bytes in ciphers:
+                for size in [0, 1, 4096, len(plaintext)]:
+                    with FileWriter.from_file(filename, auth_token, cipher, key_bytes) as fout:
+                        # uneven writes to cross the extent boundaries
+                        for offset in range(0, size, 1000):
+                            fout.write(plaintext[offset:min(size, offset + 1000)])
+
+                    self.assertEqual(os.path.getsize(filename), 8192 + (size + 4095) // 4096 * 4096)
+                    with pecryptfs.file.File.from_file(filename, auth_token, cipher, key_bytes) as fin:
+                        self.assertEqual(fin.read(), plaintext[0:size], (cipher, key_bytes, size))
+
+    def test_file_writer_file_size(self) -> None:
+        auth_token = AuthToken('Test')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "file.raw")
+            with FileWriter(open(filename, "wb"), auth_token, 'aes', 16, file_size=5) as fout:
+                fout.write(b"Hello")
+            with pecryptfs.file.File.from_file(filename, auth_token, 'aes', 16) as fin:
+                self.assertEqual(fin.read(), b"Hello")
+
+            with self.assertRaises(RuntimeError):
+                with FileWriter(open(filename, "wb"), auth_token, 'aes', 16, file_size=5) as fout:
+                    fout.write(b"Hello World")
+
+    def test_derive_extent_iv(self) -> None:
+        root_iv = bytes(range(16))
+        self.assertEqual(derive_extent_iv(root_iv, 0),
+                         hashlib.md5(root_iv + b"0" + b"\x00" * 15).digest())
+        self.assertEqual(derive_extent_iv(root_iv, 12345),
+                         hashlib.md5(root_iv + b"12345" + b"\x00" * 11).digest())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -17,9 +17,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import random
 import unittest
-from pecryptfs import AuthToken, decrypt_filename, encrypt_filename
-from pecryptfs.filename import convert_6bit_to_8bit, convert_8bit_to_6bit
+from pecryptfs import AuthToken, FilenameCodec, decrypt_filename, encrypt_filename
+from pecryptfs.filename import (convert_6bit_to_8bit, convert_8bit_to_6bit,
+                                convert_6bit_to_8bit_reference, convert_8bit_to_6bit_reference)
 
 
 class TestFilename(unittest.TestCase):
@@ -89,6 +91,27 @@ class TestFilename(unittest.TestCase):
         with self.assertRaises(Exception):
             decrypt_filename(enc_filename, wrong_auth_token)
 
+    def test_codec(self) -> None:
+        auth_token = AuthToken("Test")
+        filenames = ["HelloWorld", "a", "TestFile", "1" * 143, "b"]
+
+        codec = FilenameCodec(auth_token)
+        encrypted = list(codec.encrypt_many(filenames))
+        self.assertEqual(encrypted, [encrypt_filename(filename, auth_token) for filename in filenames])
+        self.assertEqual(list(codec.decrypt_many(encrypted)), filenames)
+        self.assertEqual(list(codec.decrypt_many(["TestFile"])), ["TestFile"])
+
+        with self.assertRaises(ValueError):
+            FilenameCodec(AuthToken("Password")).decrypt(encrypted[0])
+
+    def test_truncated(self) -> None:
+        enc_filename = "ECRYPTFS_FNEK_ENCRYPTED.FWYp3QmdieuVx-ReNM93cFJhZmQKb9S.7xyoDzbVOSbBh3ttRUURq5F-zE--"
+        codec = FilenameCodec(AuthToken("Test"))
+        with self.assertRaises(ValueError):
+            codec.decrypt(enc_filename[:-8])
+        # a bad name must not break the following ones
+        self.assertEqual(codec.decrypt(enc_filename), "TestFile")
+
     def test_convert_8bit_to_6bit(self) -> None:
         text = "FWYp3QmdieuVx-ReNM93cFJhZmQKb9S.7xyoDzbVOSbBh3ttRUURq5F-zE--"
         result = (b"F)5\x15\xcc\xa9\xba\xae\xa1\xf4\x07je\x82\xc5\xa1\x15m\x97'\x16\x9c\xb7\x81'\xdf"
@@ -103,6 +126,18 @@ class TestFilename(unittest.TestCase):
         self.assertEqual(result, convert_8bit_to_6bit(text))
         self.assertEqual(text, convert_6bit_to_8bit(convert_8bit_to_6bit(text)))
 
+    def test_convert_reference(self) -> None:
+        rng = random.Random(0)
+        for length in list(range(0, 20)) + [143, 200, 255]:
+            data_8bit = bytes(rng.randrange(256) for _ in range(length))
+            data_6bit = "".join(rng.choice("-.0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz")
+                                for _ in range(length))
+            self.assertEqual(convert_8bit_to_6bit(data_8bit), convert_8bit_to_6bit_reference(data_8bit))
+            self.assertEqual(convert_6bit_to_8bit(data_6bit), convert_6bit_to_8bit_reference(data_6bit))
+
+        # characters outside of the alphabet decode as zero
+        self.assertEqual(convert_6bit_to_8bit("a+/=_ b"), convert_6bit_to_8bit_reference("a+/=_ b"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pecryptfs import AuthToken, FilenameCodec
+from pecryptfs.filename_index import SqliteFilenameIndex
+
+
+class TestSqliteFilenameIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.root = os.path.join(self.tmpdir.name, "root")
+        self.codec = FilenameCodec(AuthToken("Test"), key_bytes=16)
+
+        os.makedirs(os.path.join(self.root, self.codec.encrypt("Documents")))
+        for name in ["TestFile", "Other"]:
+            self.touch(os.path.join(self.root, self.codec.encrypt("Documents"), self.codec.encrypt(name)))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def touch(self, path: str) -> None:
+        with open(path, "w"):
+            pass
+
+    def test_listdir(self) -> None:
+        directory = os.path.join(self.root, self.codec.encrypt("Documents"))
+        db_path = os.path.join(self.tmpdir.name, "cache", "index.sqlite")
+
+        with SqliteFilenameIndex(db_path, self.codec) as index:
+            self.assertEqual(sorted(index.listdir(directory).values()), ["Other", "TestFile"])
+
+            # unchanged directories are served from the database
+            with mock.patch.object(self.codec, "decrypt_many") as decrypt_many:
+                self.assertEqual(len(index.listdir(directory)), 2)
+                decrypt_many.assert_not_called()
+
+        self.assertEqual(os.stat(db_path).st_mode & 0o777, 0o600)
+
+        # persisted, and updated once the directory changes
+        self.touch(os.path.join(directory, self.codec.encrypt("New")))
+        st = os.stat(directory)
+        os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        with SqliteFilenameIndex(db_path, self.codec) as index:
+            self.assertEqual(sorted(index.listdir(directory).values()), ["New", "Other", "TestFile"])
+
+    def test_lookup(self) -> None:
+        with SqliteFilenameIndex(":memory:", self.codec) as index:
+            self.assertEqual(index.lookup(self.root, "Documents/Other"),
+                             os.path.join(self.root, self.codec.encrypt("Documents"), self.codec.encrypt("Other")))
+            self.assertIsNone(index.lookup(self.root, "Documents/Missing"))
+            self.assertEqual(index.decrypt(self.root, self.codec.encrypt("Documents")), "Documents")
+
+    def test_non_utf8_name(self) -> None:
+        name = os.fsdecode(b"caf\xe9.txt")
+        directory = os.path.join(self.root, self.codec.encrypt("Documents"))
+        self.touch(os.path.join(directory, self.codec.encrypt(name)))
+
+        with SqliteFilenameIndex(":memory:", self.codec) as index:
+            self.assertIn(name, index.listdir(directory).values())
+            self.assertEqual(index.lookup(self.root, "Documents/" + name),
+                             os.path.join(directory, self.codec.encrypt(name)))
+
+    def test_other_key(self) -> None:
+        other = FilenameCodec(AuthToken("Other"), key_bytes=16)
+        self.touch(os.path.join(self.root, other.encrypt("Foreign")))
+
+        db_path = os.path.join(self.tmpdir.name, "index.sqlite")
+        with SqliteFilenameIndex(db_path, self.codec) as index:
+            self.assertEqual(list(index.listdir(self.root).values()), ["Documents"])
+        with SqliteFilenameIndex(db_path, other) as index:
+            self.assertEqual(list(index.listdir(self.root).values()), ["Foreign"])
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
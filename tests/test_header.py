@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import unittest
+
+from pecryptfs import AuthToken
+from pecryptfs.header import FileHeader, parse_packet_length
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestFileHeader(unittest.TestCase):
+
+    def test_from_path(self) -> None:
+        signature = AuthToken("Test").signature_text
+
+        files = [("aes-16", "aes", 16), ("aes-24", "aes", 32), ("aes-32", "aes", 32),
+                 ("blowfish-16", "blowfish", 16), ("blowfish-56", "blowfish", 56),
+                 ("cast5-16", "cast5", 16), ("cast6-32", "cast6", 32),
+                 ("des3_ede-24", "des3_ede", 24), ("twofish-16", "twofish", 16)]
+        for name, cipher, encrypted_key_size in files:
+            with self.subTest(name=name):
+                header = FileHeader.from_path(os.path.join(DATADIR, name + ".raw"))
+                self.assertEqual(header.file_size, 12)
+                self.assertEqual(header.version, 3)
+                self.assertEqual(header.header_extent_size, 4096)
+                self.assertEqual(header.data_offset, 8192)
+                self.assertEqual(header.cipher, cipher)
+                self.assertEqual(len(header.encrypted_key), encrypted_key_size)
+                self.assertEqual(header.key_bytes, int(name.rsplit("-", 1)[1]))
+                self.assertEqual(header.salt.hex(), "0011223344556677")
+                self.assertEqual(header.signature.hex(), signature)
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(RuntimeError):
+            FileHeader(b"")
+        with self.assertRaises(RuntimeError):
+            FileHeader(bytes(8192))
+
+        with open(os.path.join(DATADIR, "aes-16.raw"), "rb") as fin:
+            header = fin.read(8192)
+        with self.assertRaises(RuntimeError):
+            FileHeader(header[:60])
+
+    def test_parse_packet_length(self) -> None:
+        self.assertEqual(parse_packet_length(b"\x1d", 0), (29, 1))
+        self.assertEqual(parse_packet_length(b"\x00\xc1\x08", 1), (456, 2))
+        with self.assertRaises(RuntimeError):
+            parse_packet_length(b"\xff", 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
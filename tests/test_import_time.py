@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from typing import Dict
+
+import os
+import subprocess
+import sys
+import unittest
+
+import pecryptfs
+
+
+SRCDIR = os.path.join(os.path.dirname(__file__), '..')
+
+# modules that are slow to import and only needed for actual
+# decryption or for the bulk password search
+HEAVY_MODULES = ("Crypto", "cryptography", "multiprocessing")
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds of every module imported
+    by a fresh interpreter importing module, see python -X importtime"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([SRCDIR] + [p for p in [env.get("PYTHONPATH")] if p])
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                          env=env, capture_output=True, text=True, check=True)
+
+    result: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        result[name.strip()] = int(cumulative)
+    return result
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_lazy_exports(self) -> None:
+        self.assertIn("File", dir(pecryptfs))
+        self.assertEqual(pecryptfs.File.__name__, "File")
+        with self.assertRaises(AttributeError):
+            pecryptfs.NoSuchThing  # pylint: disable=pointless-statement,no-member
+
+    def test_no_heavy_imports(self) -> None:
+        for module in ["pecryptfs", "pecryptfs.cmd_makesig", "pecryptfs.cmd_ls",
+                       "pecryptfs.cmd_filename", "pecryptfs.cmd_decrypt", "pecryptfs.cmd_scan"]:
+            heavy = [name for name in import_times(module) if name.startswith(HEAVY_MODULES)]
+            self.assertEqual(heavy, [], module)
+
+        # only needed for pecryptfs-ls --index
+        self.assertNotIn("sqlite3", import_times("pecryptfs.cmd_ls"))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import argparse
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from pecryptfs import AuthToken
+from pecryptfs.key_cache import KeyCache, add_key_cache_arguments
+
+
+class TestKeyCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.directory = os.path.join(self.tmpdir.name, "pecryptfs")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def filename(self, key_cache: KeyCache, password: bytes = b"Password") -> str:
+        return key_cache._filename(b"salt", password)  # pylint: disable=protected-access
+
+    def test_put_get(self) -> None:
+        key_cache = KeyCache(self.directory)
+        self.assertIsNone(key_cache.get(b"salt", b"Password"))
+
+        key_cache.put(b"salt", b"Password", b"k" * 64)
+        self.assertEqual(key_cache.get(b"salt", b"Password"), b"k" * 64)
+        self.assertIsNone(key_cache.get(b"salt", b"Other"))
+        self.assertIsNone(key_cache.get(b"tlas", b"Password"))
+
+        self.assertEqual(os.stat(self.directory).st_mode & 0o777, 0o700)
+        for name in os.listdir(self.directory):
+            self.assertEqual(os.stat(os.path.join(self.directory, name)).st_mode & 0o777, 0o600)
+
+        key_cache.clear()
+        self.assertIsNone(key_cache.get(b"salt", b"Password"))
+
+    def test_ttl(self) -> None:
+        key_cache = KeyCache(self.directory, ttl=60)
+        key_cache.put(b"salt", b"Password", b"k" * 64)
+
+        for name in os.listdir(self.directory):
+            old = time.time() - 120
+            os.utime(os.path.join(self.directory, name), (old, old))
+
+        self.assertIsNone(key_cache.get(b"salt", b"Password"))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_expire(self) -> None:
+        key_cache = KeyCache(self.directory, ttl=60)
+        key_cache.put(b"salt", b"Password", b"k" * 64)
+        for name in os.listdir(self.directory):
+            old = time.time() - 120
+            os.utime(os.path.join(self.directory, name), (old, old))
+
+        # expired entries of other passwords are removed as well
+        key_cache.put(b"salt", b"Other", b"o" * 64)
+        self.assertEqual(os.listdir(self.directory), [os.path.basename(self.filename(key_cache, b"Other"))])
+
+    def test_same_process(self) -> None:
+        key_cache = KeyCache(self.directory)
+        real_replace = os.replace
+
+        # another thread of this process writes the same key while the
+        # first one still holds its tmpfile
+        def replace(src: str, dst: str) -> None:
+            if replace_mock.call_count == 1:
+                key_cache.put(b"salt", b"Password", b"k" * 64)
+            real_replace(src, dst)
+
+        with mock.patch("os.replace", side_effect=replace) as replace_mock:
+            key_cache.put(b"salt", b"Password", b"k" * 64)
+        self.assertEqual(replace_mock.call_count, 2)
+        self.assertEqual(os.listdir(self.directory), [os.path.basename(self.filename(key_cache))])
+
+    def test_concurrent_removal(self) -> None:
+        key_cache = KeyCache(self.directory, ttl=60)
+        key_cache.put(b"salt", b"Password", b"k" * 64)
+        for name in os.listdir(self.directory):
+            old = time.time() - 120
+            os.utime(os.path.join(self.directory, name), (old, old))
+
+        # another process removed the expired entry first
+        with mock.patch("os.unlink", side_effect=FileNotFoundError):
+            self.assertIsNone(key_cache.get(b"salt", b"Password"))
+
+    def test_concurrent_mkdir(self) -> None:
+        key_cache = KeyCache(self.directory)
+        # another process creates the directory between the check and makedirs()
+        real_check = key_cache._check_directory  # pylint: disable=protected-access
+        with mock.patch.object(key_cache, "_check_directory", side_effect=[False, True, True]):
+            os.mkdir(self.directory, 0o700)
+            key_cache.put(b"salt", b"Password", b"k" * 64)
+        self.assertTrue(real_check())
+        self.assertEqual(key_cache.get(b"salt", b"Password"), b"k" * 64)
+
+    def test_put_failure(self) -> None:
+        blocker = os.path.join(self.tmpdir.name, "file")
+        with open(blocker, "wb"):
+            pass
+        key_cache = KeyCache(os.path.join(blocker, "pecryptfs"))
+        key_cache.put(b"salt", b"Password", b"k" * 64)
+        self.assertIsNone(key_cache.get(b"salt", b"Password"))
+
+    def test_insecure_directory(self) -> None:
+        os.mkdir(self.directory, 0o755)
+        os.chmod(self.directory, 0o755)
+        with self.assertRaises(RuntimeError):
+            KeyCache(self.directory).get(b"salt", b"Password")
+
+    def test_auth_token(self) -> None:
+        key_cache = KeyCache(self.directory)
+        session_key = AuthToken("Password", key_cache=key_cache).session_key
+        self.assertEqual(session_key, AuthToken("Password").session_key)
+
+        # a cached key is used as is, without running the key derivation
+        auth_token = AuthToken("Password")
+        key_cache.put(auth_token.salt_bin, auth_token.password_bin, b"k" * 64)
+        self.assertEqual(AuthToken("Password", key_cache=key_cache).session_key, b"k" * 64)
+
+    def test_arguments(self) -> None:
+        parser = argparse.ArgumentParser()
+        add_key_cache_arguments(parser.add_argument_group("Authentication"))
+        self.assertIsNone(parser.parse_args([]).key_cache)
+        self.assertTrue(parser.parse_args(["--key-cache"]).key_cache)
+        self.assertFalse(parser.parse_args(["--no-key-cache"]).key_cache)
+
+    def test_from_env(self) -> None:
+        environ = dict(os.environ)
+        try:
+            os.environ["XDG_RUNTIME_DIR"] = self.tmpdir.name
+            os.environ.pop("PECRYPTFS_KEY_CACHE", None)
+            self.assertIsNone(KeyCache.from_env())
+            self.assertIsNone(KeyCache.from_env(False))
+
+            key_cache = KeyCache.from_env(True)
+            assert key_cache is not None
+            self.assertEqual(key_cache.directory, self.directory)
+
+            os.environ["PECRYPTFS_KEY_CACHE"] = "1"
+            self.assertIsNotNone(KeyCache.from_env())
+            self.assertIsNone(KeyCache.from_env(False))
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from pecryptfs import AuthToken, encrypt_filename
+from pecryptfs.mount import MountOperations
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestMount(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        auth_token = AuthToken("Test")
+
+        def enc(name: str) -> str:
+            return encrypt_filename(name, auth_token, key_bytes=16)
+
+        subdir = os.path.join(self.tmpdir.name, enc("Documents"))
+        os.makedirs(subdir)
+        shutil.copy(os.path.join(DATADIR, "aes-16.raw"), os.path.join(self.tmpdir.name, enc("TestFile")))
+        shutil.copy(os.path.join(DATADIR, "aes-16.raw"), os.path.join(subdir, enc("Other")))
+        os.symlink(enc("TestFile"), os.path.join(self.tmpdir.name, enc("Link")))
+        os.makedirs(os.path.join(self.tmpdir.name, "lost+found"))
+
+        self.ops = MountOperations(self.tmpdir.name, auth_token, "aes", 16)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_readdir(self) -> None:
+        self.assertEqual(sorted(self.ops.readdir("/")), [".", "..", "Documents", "Link", "TestFile", "lost+found"])
+        self.assertEqual(sorted(self.ops.readdir("/Documents")), [".", "..", "Other"])
+
+    def test_getattr(self) -> None:
+        attrs = self.ops.getattr("/Documents/Other")
+        self.assertEqual(attrs["st_size"], 12)
+        self.assertTrue(stat.S_ISREG(attrs["st_mode"]))
+        self.assertFalse(attrs["st_mode"] & stat.S_IWUSR)
+
+        self.assertTrue(stat.S_ISDIR(self.ops.getattr("/Documents")["st_mode"]))
+        self.assertEqual(self.ops.readlink("/Link"), "TestFile")
+        self.assertEqual(self.ops.getattr("/Link")["st_size"], len("TestFile"))
+        self.assertTrue(stat.S_ISDIR(self.ops.getattr("/lost+found")["st_mode"]))
+
+        with self.assertRaises(OSError) as ctx:
+            self.ops.getattr("/Missing")
+        self.assertEqual(ctx.exception.errno, errno.ENOENT)
+
+    def test_read(self) -> None:
+        fh = self.ops.open("/TestFile", os.O_RDONLY)
+        try:
+            self.assertEqual(self.ops.read("/TestFile", 5, 6, fh), b"World")
+            self.assertEqual(self.ops.read("/TestFile", 4096, 0, fh), b"Hello World\n")
+            self.assertEqual(self.ops.read("/TestFile", 10, 100, fh), b"")
+        finally:
+            self.ops.release("/TestFile", fh)
+
+        with self.assertRaises(OSError) as ctx:
+            self.ops.open("/TestFile", os.O_WRONLY)
+        self.assertEqual(ctx.exception.errno, errno.EROFS)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+# pecryptfs - Portable Userspace eCryptfs
+# Copyright (C) 2015 Ingo Ruhnke <grumbel@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import io
+import os
+import unittest
+from unittest import mock
+
+from pecryptfs.auth_token import AuthToken
+from pecryptfs.file import File
+from pecryptfs.filename import FilenameCodec
+from pecryptfs.stats import Stats, command_stats, timer
+
+
+DATADIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TestStats(unittest.TestCase):
+
+    def test_add(self) -> None:
+        stats = Stats()
+        stats.add("read", 100, 1000)
+        stats.add("read", 50, 500)
+        with stats.timer("decrypt", 10):
+            pass
+        with timer(None, "ignored"):
+            pass
+
+        result = stats.to_dict()
+        self.assertEqual(result["read"], {"calls": 2, "bytes": 150, "ns": 1500})
+        self.assertEqual(result["decrypt"]["calls"], 1)
+        self.assertNotIn("ignored", result)
+        self.assertEqual(sorted(line.split()[0] for line in stats.format().splitlines()[1:]), ["decrypt", "read"])
+
+        stats.clear()
+        self.assertEqual(len(stats), 0)
+
+    def test_file(self) -> None:
+        stats = Stats()
+        auth_token = AuthToken('Test')
+        with File.from_file(os.path.join(DATADIR, 'aes-16.raw'), auth_token, 'aes', 16, stats=stats) as fin:
+            with io.BufferedReader(fin) as bufin:
+                self.assertEqual(bufin.read(), b'Hello World\n')
+
+        result = stats.to_dict()
+        self.assertEqual(set(result), {"header", "fek_unwrap", "cipher_setup", "read", "iv", "decrypt"})
+        self.assertEqual(result["decrypt"]["bytes"], 4096)
+        self.assertEqual(result["iv"]["calls"], 1)
+
+    def test_filename_codec(self) -> None:
+        stats = Stats()
+        codec = FilenameCodec(AuthToken('Test'), 'aes', 16, stats=stats)
+        codec.decrypt(codec.encrypt("Hello World"))
+        codec.decrypt("plain")
+
+        result = stats.to_dict()
+        self.assertEqual(result["cipher_setup"]["calls"], 1)
+        self.assertEqual(result["filename_cipher"]["calls"], 2)
+        self.assertEqual(result["filename_codec"]["calls"], 2)
+
+    def test_command_stats(self) -> None:
+        auth_token = AuthToken('Test')
+        self.assertIsNone(command_stats(False, auth_token))
+
+        with mock.patch.object(Stats, "print_at_exit") as print_at_exit:
+            stats = command_stats(True, auth_token)
+        assert stats is not None
+        print_at_exit.assert_called_once_with()
+        self.assertEqual(stats.to_dict()["kdf"]["calls"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+# EOF #